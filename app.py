@@ -1,24 +1,111 @@
-from flask import Flask, render_template, request, send_from_directory
+from flask import Flask, Response, g, jsonify, render_template, request, send_from_directory, url_for
 import os
-from writer import draw_spell  # Assuming writer.py has the draw_spell function for generating visuals
+import re
+import time
+from contextlib import contextmanager
+from writer import render_spell  # Draws spells on their own figure, so concurrent requests are safe
+from writer import spell_svg  # Writes SVG directly, without matplotlib
+from registry import get_registry
+from render_cache import RenderCache
+from render_queue import QueueFull, RenderQueue
+import metrics as prometheus
+import timing
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'static/generated'
+# Byte budget of the generated images; least recently used images are deleted beyond it
+app.config['RENDER_CACHE_BYTES'] = int(os.environ.get('SPELL_RENDER_CACHE_BYTES', 256 * 2 ** 20))
+# Generated images never change under their content-addressed name, so browsers and
+# proxies may keep them for as long as they like
+app.config['IMAGE_MAX_AGE'] = 365 * 24 * 3600
 
-# Ensure the upload folder exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Background renders: number of worker threads (or processes), the most renders that may
+# be queued or running before new ones are refused with 429, and whether /generate queues
+# its render and lets the page poll for it instead of rendering within the request
+app.config['RENDER_WORKERS'] = int(os.environ.get('SPELL_RENDER_WORKERS', 2))
+app.config['RENDER_QUEUE_DEPTH'] = int(os.environ.get('SPELL_RENDER_QUEUE_DEPTH', 32))
+app.config['RENDER_PROCESSES'] = os.environ.get('SPELL_RENDER_PROCESSES', '0') == '1'
+app.config['ASYNC_GENERATE'] = os.environ.get('SPELL_ASYNC_GENERATE', '0') == '1'
 
-# Folder where the attributes text files are stored
-ATTRIBUTES_FOLDER = os.path.join("Attributes")
+# Attribute lists shared with writer.py, loaded once and reloaded when a file changes
+attributes = get_registry()
 
+# Cache of rendered spells, keyed by their normalised attributes, the indices these resolve
+# to in the attribute files (so an edited file never serves old glyphs) and rendering options
+render_cache = RenderCache(app.config['UPLOAD_FOLDER'], max_bytes=app.config['RENDER_CACHE_BYTES'],
+                           registry=attributes)
 
-# Function to load dropdown options from the attribute files
+# Queue of background renders; a job's id is the cache key of the image it renders
+render_queue = RenderQueue(workers=app.config['RENDER_WORKERS'],
+                           max_pending=app.config['RENDER_QUEUE_DEPTH'],
+                           processes=app.config['RENDER_PROCESSES'])
+
+# Metrics published at /metrics: requests, render stage timings from writer.py's spans,
+# the render cache and the renders in progress. Renders run by worker processes
+# (SPELL_RENDER_PROCESSES=1) happen outside this process and are not included.
+metrics = prometheus.Metrics(prefix="spell_")
+metrics.counter("http_requests_total", "HTTP requests answered, by endpoint, method and status.")
+metrics.summary("http_request_seconds", "Time taken to answer HTTP requests, by endpoint.")
+metrics.summary("render_stage_seconds", "Time spent in each stage of drawing a spell (stages nest).")
+metrics.counter("render_cache_hits_total", "Images found in the render cache.",
+                value=lambda: render_cache.hits)
+metrics.counter("render_cache_misses_total", "Images rendered because they were not cached.",
+                value=lambda: render_cache.misses)
+metrics.gauge("render_cache_hit_ratio", "Fraction of cached image lookups that were hits.",
+              value=lambda: render_cache.hits / max(1, render_cache.hits + render_cache.misses))
+metrics.gauge("renders_in_flight", "Spells being rendered right now.")
+metrics.set("renders_in_flight", 0)
+metrics.gauge("render_queue_pending", "Background renders queued or running.",
+              value=lambda: render_queue.pending)
+timing.add_hook(lambda stage, seconds: metrics.observe("render_stage_seconds", seconds, {"stage": stage}))
+
+
+@contextmanager
+def in_flight():
+    # Counts a render as in progress for the duration of a `with` block
+    metrics.inc("renders_in_flight")
+    try:
+        yield
+    finally:
+        metrics.inc("renders_in_flight", amount=-1)
+
+
+@app.before_request
+def start_timer():
+    g.start_time = time.perf_counter()
+
+
+@app.after_request
+def count_request(response):
+    endpoint = request.endpoint or "unknown"
+    metrics.inc("http_requests_total", {"endpoint": endpoint, "method": request.method,
+                                        "status": str(response.status_code)})
+    if "start_time" in g:
+        metrics.observe("http_request_seconds", time.perf_counter() - g.start_time,
+                        {"endpoint": endpoint})
+    return response
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=prometheus.CONTENT_TYPE)
+
+
+# Rendering options of the images made by the form and the job endpoints
+GENERATE_OPTIONS = {"fmt": "png", "legend": True}
+
+# Function to load dropdown options (value, label) from the attribute files
 def load_attributes(attribute_name):
-    file_path = os.path.join(ATTRIBUTES_FOLDER, f"{attribute_name}.txt")
-    if not os.path.isfile(file_path):
+    if not os.path.isfile(attributes.path(attribute_name)):
         return []
-    with open(file_path, "r") as file:
-        return [line.strip() for line in file.readlines()]
+    return attributes.options(attribute_name)
+
+
+# Function to check a spell's values (by attribute file) and return them normalised, so
+# spells that differ only in case are rendered, cached and tagged identically
+def read_spell(values):
+    return {name: attributes.values(name)[attributes.index(name, value)]
+            for name, value in values.items()}
 
 
 @app.route('/')
@@ -40,41 +127,217 @@ def index():
     )
 
 
+# Function to look a spell's image up by content, rendering it with writer.py (on a figure
+# private to this call) only if no identical spell has been rendered before. It is also the
+# job run by the render queue's workers, so it only takes picklable arguments.
+def render_generated(key, spell):
+    def render():
+        with in_flight():
+            return render_spell(
+                level=spell["levels"],
+                rang=spell["range"],
+                area=spell["area_types"],
+                dtype=spell["damage_types"],
+                school=spell["school"],
+                legend=True
+            )
+    return render_cache.get(key, render)
+
+
+# Function to read and check the spell of a form (or JSON body), returning it normalised
+def read_form(form):
+    values = {"levels": form.get('level'), "range": form.get('range'),
+              "area_types": form.get('area'), "damage_types": form.get('dtype'),
+              "school": form.get('school')}
+    if not all(values.values()):
+        raise ValueError("Please fill all the fields.")
+    return read_spell(values)
+
+
 @app.route('/generate', methods=['POST'])
 def generate():
-    # Fetch the form data
-    level = request.form.get('level')
-    rang = request.form.get('range')
-    area = request.form.get('area')
-    dtype = request.form.get('dtype')
-    school = request.form.get('school')
-
-    if not all([level, rang, area, dtype, school]):
-        return "Invalid input! Please fill all the fields.", 400
-
-    # Use the writer.py function to generate an image with the selected attributes
-    image_filename = f"spell_{level}_{rang}_{area}_{dtype}_{school}.png"
-    image_path = os.path.join(app.config['UPLOAD_FOLDER'], image_filename)
-
-    # Generate the spell visualization using draw_spell from writer.py
-    draw_spell(
-        level=level,
-        rang=rang,
-        area=area,
-        dtype=dtype,
-        school=school,
-        savename=image_path,
-        legend=True
-    )
+    # Attribute values by attribute file, checked before anything is rendered or cached
+    try:
+        spell = read_form(request.form)
+    except ValueError as e:
+        return f"Invalid input! {e}", 400
+
+    key = render_cache.key(spell, GENERATE_OPTIONS)
+    if app.config['ASYNC_GENERATE'] and not os.path.isfile(render_cache.path(key)):
+        # Queue the render and let the page poll for it
+        try:
+            render_queue.submit(key, render_generated, key, spell)
+        except QueueFull:
+            return "Too many spells are being drawn, please try again shortly.", 429, {"Retry-After": "1"}
+        return render_template("index.html", job_id=key)
+    image_path = render_generated(key, spell)
 
     # Render the template with the generated image
     return render_template("index.html", generated_image=image_path)
 
 
+# Job ids are render cache keys: 32 hexadecimal digits
+JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def job_status(job_id):
+    # State of a job, also "done" for a finished image the queue no longer remembers
+    status = render_queue.status(job_id)
+    if status is None and os.path.isfile(render_cache.path(job_id)):
+        status = ("done", None)
+    return status
+
+
+def job_response(job_id, status, code=200):
+    state, error = status
+    body = {"id": job_id, "status": state,
+            "status_url": url_for('job', job_id=job_id),
+            "result_url": url_for('job_result', job_id=job_id)}
+    if error is not None:
+        body["error"] = error
+    response = jsonify(body)
+    response.status_code = code
+    if state in ("queued", "running"):
+        response.headers["Retry-After"] = "1"
+    return response
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    # Queues a spell (form fields or JSON with level, range, area, dtype and school) and
+    # answers at once with the job's id and the URLs to poll for its status and image
+    try:
+        spell = read_form(request.get_json(silent=True) or request.form)
+    except ValueError as e:
+        return jsonify(error=f"Invalid input! {e}"), 400
+    key = render_cache.key(spell, GENERATE_OPTIONS)
+    if os.path.isfile(render_cache.path(key)):
+        return job_response(key, ("done", None))
+    try:
+        state = render_queue.submit(key, render_generated, key, spell)
+    except QueueFull as e:
+        response = jsonify(error=f"Too many renders queued: {e}")
+        response.status_code = 429
+        response.headers["Retry-After"] = "1"
+        return response
+    response = job_response(key, (state, None), 202)
+    response.headers["Location"] = url_for('job', job_id=key)
+    return response
+
+
+@app.route('/jobs/<job_id>')
+def job(job_id):
+    status = job_status(job_id) if JOB_ID.fullmatch(job_id) else None
+    if status is None:
+        return jsonify(error="Unknown job"), 404
+    return job_response(job_id, status)
+
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    # The image once the job is done; otherwise the job's status (202 while it is pending)
+    status = job_status(job_id) if JOB_ID.fullmatch(job_id) else None
+    if status is None:
+        return jsonify(error="Unknown job"), 404
+    if status[0] == "done":
+        return serve_image(render_cache.filename(job_id))
+    return job_response(job_id, status, 500 if status[0] == "failed" else 202)
+
+
+# Formats the GET endpoint can encode, with their content types
+IMAGE_TYPES = {"png": "image/png", "svg": "image/svg+xml", "pdf": "application/pdf"}
+
+
+def parse_image_options(args):
+    # Optional dpi and size ("6" or "6x4", in inches) of a GET request, checked against
+    # limits so a single request cannot ask for an enormous image
+    options = {}
+    if args.get("dpi"):
+        dpi = float(args["dpi"])
+        if not 10 <= dpi <= 600:
+            raise ValueError("dpi must be between 10 and 600")
+        options["dpi"] = dpi
+    if args.get("size"):
+        size = [float(v) for v in args["size"].lower().split("x")]
+        if len(size) == 1:
+            size = size * 2
+        if len(size) != 2 or not all(0.5 <= v <= 40 for v in size):
+            raise ValueError("size must be 'W' or 'WxH' inches, each between 0.5 and 40")
+        options["figsize"] = tuple(size)
+    return options
+
+
+@app.route('/spell.<fmt>')
+def spell_image(fmt):
+    # Renders a spell straight into memory and streams it back, e.g.
+    # /spell.png?level=3&range=150 feet&area=sphere (20)&dtype=fire&school=evocation&dpi=200
+    if fmt not in IMAGE_TYPES:
+        return f"Unsupported format! Use one of: {', '.join(IMAGE_TYPES)}", 404
+    values = {"levels": request.args.get('level'), "range": request.args.get('range'),
+              "area_types": request.args.get('area'), "damage_types": request.args.get('dtype'),
+              "school": request.args.get('school')}
+    if not all(values.values()):
+        return "Invalid input! level, range, area, dtype and school are required.", 400
+    try:
+        spell = read_spell(values)
+        options = parse_image_options(request.args)
+    except ValueError as e:
+        return f"Invalid input! {e}", 400
+    legend = request.args.get('legend', '1').lower() not in ('0', 'false', 'no')
+
+    # The content hash (which covers the values' indices in the attribute files) is the
+    # ETag, so a revalidation is answered without rendering
+    if fmt == "svg":
+        options.pop("dpi", None)  # vector output has no resolution
+        options["native"] = True
+    etag = render_cache.key(spell, dict(options, fmt=fmt, legend=legend))
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    elif fmt == "svg":
+        # SVG is written straight from the glyph geometry: much faster and smaller than
+        # going through a matplotlib figure
+        with in_flight():
+            response = Response(spell_svg(
+                level=spell["levels"],
+                rang=spell["range"],
+                area=spell["area_types"],
+                dtype=spell["damage_types"],
+                school=spell["school"],
+                legend=legend,
+                background="white",
+                size=options.get("figsize")
+            ), mimetype=IMAGE_TYPES[fmt])
+    else:
+        with in_flight():
+            response = Response(render_spell(
+                level=spell["levels"],
+                rang=spell["range"],
+                area=spell["area_types"],
+                dtype=spell["damage_types"],
+                school=spell["school"],
+                legend=legend,
+                fmt=fmt,
+                **options
+            ), mimetype=IMAGE_TYPES[fmt])
+    # The URL names the attribute values, not the glyph: after an attribute file is
+    # edited the same URL draws a different image, so caches must revalidate (cheaply,
+    # with the ETag) rather than keep the response as immutable
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
+
+
 @app.route('/static/generated/<filename>')
 def serve_image(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    # The file name is the image's content hash, so it doubles as a strong ETag
+    response = send_from_directory(app.config['UPLOAD_FOLDER'], filename,
+                                   etag=os.path.splitext(filename)[0],
+                                   max_age=app.config['IMAGE_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    app.run(debug=True, threaded=True)
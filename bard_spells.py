@@ -1,5 +1,40 @@
-from writer import load_attribute
-import librosa
+from registry import get_registry
+from functools import lru_cache
+import itertools
+import math
+import numbers
+import os
+import wave
+
+import numpy as np
+
+# Note names of the twelve semitones of an octave, starting from C
+NOTE_NAMES = ["C", "C♯", "D", "D♯", "E", "F", "F♯", "G", "G♯", "A", "A♯", "B"]
+
+
+# Function to name the notes of frequencies, like librosa.hz_to_note but without loading librosa
+def hz_to_note(frequencies, A4=440, octave=True, unicode=True):
+    """
+    Converts frequencies to the names of their nearest equal-tempered notes.
+
+    Args:
+        frequencies (float or list): Frequency or frequencies in Hz.
+        A4 (float): Tuning frequency of A4 (default is 440 Hz).
+        octave (bool): Append the octave number (e.g. "A4" rather than "A").
+        unicode (bool): Write sharps as "♯" (as librosa does) rather than "#".
+
+    Returns:
+        str or list: The note name, or a list of names for a list of frequencies.
+    """
+    if not isinstance(frequencies, numbers.Real):
+        return [hz_to_note(f, A4=A4, octave=octave, unicode=unicode) for f in frequencies]
+    midi = int(round(12 * math.log2(frequencies / A4) + 69))  # MIDI note number, A4 = 69
+    name = NOTE_NAMES[midi % 12]
+    if not unicode:
+        name = name.replace("♯", "#")
+    if octave:
+        name += str(midi // 12 - 1)
+    return name
 
 
 # Class for defining and using a musical scale
@@ -40,6 +75,10 @@ class scale():
         return f
 
 
+# Attribute files of the notes of a chord, lowest voice first
+CHORD_ATTRIBUTES = ["range", "levels", "area_types", "damage_types", "school"]
+
+
 # Function to create a set of frequencies (chords) based on various Attributes
 def chords_maker(rang, level, area, dtype, school, scale_steps="2212221", f0=440):
     """
@@ -57,61 +96,412 @@ def chords_maker(rang, level, area, dtype, school, scale_steps="2212221", f0=440
     Returns:
         list: A list of frequencies (in Hz) representing the chord.
     """
-    # Load attribute lists from external files
-    ranges = load_attribute("Attributes/range.txt")
-    levels = load_attribute("Attributes/levels.txt")
-    area_types = load_attribute("Attributes/area_types.txt")
-    dtypes = load_attribute("Attributes/damage_types.txt")
-    schools = load_attribute("Attributes/school.txt")
+    attr, lens = chord_indices(rang, level, area, dtype, school)
 
-    # Calculate the length of each attribute list
-    lens = [len(ranges), len(levels), len(area_types), len(dtypes), len(schools)]
+    # Frequencies of the reference scale, for mapping attribute indices to frequencies
+    table = frequency_table(scale_steps, f0, max(max(lens), max(attr) + 1))
 
-    # Reference scale for mapping attribute indices to frequencies
-    reference_scale = scale(scale_steps, max_L=max(lens), f0=f0)
+    return [float(table[i]) for i in attr]
 
-    # Find indices of the provided Attributes in their respective lists
-    i_range = ranges.index(rang)
-    i_levels = levels.index(level)
-    i_area = area_types.index(area)
-    i_dtype = dtypes.index(dtype)
-    i_school = schools.index(school)
 
-    attr = [i_range, i_levels, i_area, i_dtype, i_school]
+# Function to find the notes of the scale that a spell's chord is made of
+def chord_indices(rang, level, area, dtype, school):
+    """
+    Finds the scale positions of the notes in a spell's chord, as chords_maker does.
+
+    Args:
+        rang, level, area, dtype, school (str): The spell's Attributes.
+
+    Returns:
+        tuple: (indices, lens), the scale position of each note (range, level, area,
+               damage type and school, in that order) and the length of each attribute list.
+    """
+    # Look up the attribute lists in the shared registry
+    attrs = get_registry()
+
+    # Calculate the length of each attribute list
+    lens = [len(attrs.values(name)) for name in CHORD_ATTRIBUTES]
+
+    # Find indices of the provided Attributes in their respective lists
+    attr = [attrs.index(name, value)
+            for name, value in zip(CHORD_ATTRIBUTES, [rang, level, area, dtype, school])]
 
     # Ensure all indices are unique by resolving duplicates
-    while len(set(attr)) != len(attr):
-        seen = []
-        for i, a in enumerate(attr):
-            if a in seen:
-                attr[i] += lens[i]  # Adjust duplicate indices
-            else:
-                seen.append(a)
+    attr = _resolve_duplicates(np.array([attr]), lens)[0].tolist()
+
+    return attr, lens
+
+
+# ---------Batch Chords---------#
+# Chords for many spells in one pass: the attribute values are resolved with the encoder
+# writer draws glyphs with (each distinct value once), duplicate notes are moved up as in
+# chord_indices for all spells at once, and the frequencies are read from a table computed
+# once per scale.
+CHORD_SCHEMA = (("range", "range", "range"),
+                ("level", "levels", "level"),
+                ("area", "area_types", "area_type"),
+                ("dtype", "damage_types", "damage type"),
+                ("school", "school", "school"))  # The voices of a chord, as a writer schema
+
+
+# Function to compute (or reuse) the frequencies of the notes of a scale
+def frequency_table(scale_steps="2212221", f0=440, max_L=64):
+    """
+    Frequencies of the notes of a scale, as from scale(scale_steps, max_L, f0).get_note.
+
+    Args:
+        scale_steps (str): Step intervals for the scale.
+        f0 (float): Base frequency in Hz.
+        max_L (int): The minimum number of notes.
+
+    Returns:
+        np.ndarray: Read-only array of the frequencies, in Hz, of at least max_L notes.
+    """
+    return _frequency_table(scale_steps, f0, max_L)
+
+
+@lru_cache(maxsize=64)
+def _frequency_table(scale_steps, f0, max_L):
+    a = (2) ** (1 / 12)  # Equal temperament semitone ratio, exactly as in scale.get_note
+    table = np.array([f0 * a ** N for N in scale(scale_steps, max_L=max_L).n])
+    table.setflags(write=False)
+    return table
+
+
+# Function to find the notes of the chords of many spells
+def chord_note_indices(spells):
+    """
+    The scale positions of the notes of each spell's chord, as chord_indices finds them.
+
+    Args:
+        spells (list or np.ndarray): Spells as (rang, level, area, dtype, school) tuples,
+            dicts with the keys "range", "level", "area", "dtype" and "school" (as in a
+            writer spellbook), or tuples (or an integer array) of their attribute
+            indices with one row per spell.
+
+    Returns:
+        np.ndarray: Integer array of shape (spells, 5), voices in CHORD_ATTRIBUTES order.
+    """
+    attrs = get_registry()
+    lens = [len(attrs.values(name)) for name in CHORD_ATTRIBUTES]
+    try:
+        array = np.asarray(spells)
+    except ValueError:  # Rows of different lengths; the encoder reports which is wrong
+        array = None
+    if array is not None and np.issubdtype(array.dtype, np.integer):
+        indices = array.reshape(-1, len(CHORD_ATTRIBUTES)).astype(np.intp)
+    else:
+        import writer
+        indices = writer.get_encoder(CHORD_SCHEMA).indices_many(spells)
+    return _resolve_duplicates(indices, lens)
+
+
+# Function to create the chords of many spells at once
+def chords_batch(spells, scale_steps="2212221", f0=440):
+    """
+    Vectorised chords_maker: the chord frequencies of every spell in one pass.
+
+    Args:
+        spells (list or np.ndarray): Spells, as for chord_note_indices.
+        scale_steps (str): Step intervals for the scale (default is major scale).
+        f0 (float): Base frequency (default is 440 Hz).
+
+    Returns:
+        np.ndarray: Array of shape (spells, 5) holding each chord's frequencies in Hz, in
+                    the order chords_maker returns them.
+    """
+    indices = chord_note_indices(spells)
+    lens = [len(get_registry().values(name)) for name in CHORD_ATTRIBUTES]
+    table = frequency_table(scale_steps, f0, max(max(lens), int(indices.max(initial=0)) + 1))
+    return table[indices]
+
+
+def _resolve_duplicates(indices, lens):
+    # Moves every note that repeats an earlier note of its chord up by its attribute's list
+    # length, pass after pass until the notes of every chord differ, as chords_maker always has
+    indices = np.array(indices, dtype=np.intp)
+    lens = np.asarray(lens, dtype=np.intp)
+    earlier = np.tril(np.ones((len(lens), len(lens)), dtype=bool), k=-1)  # earlier[i, j]: j < i
+    while True:
+        repeats = ((indices[:, :, None] == indices[:, None, :]) & earlier).any(axis=2)
+        if not repeats.any():
+            return indices
+        indices += repeats * lens
 
-    # Generate frequencies for the Attributes
-    f = []
-    for i in attr:
-        f.append(reference_scale.get_note(i))
 
-    return f
+# ---------Audio Synthesis and WAV Export---------#
+# A chord is played as the sum of its notes, each an additive mix of sine harmonics shaped by
+# a linear attack and release. Every note of a scale sounds the same in every chord, so the
+# enveloped waveforms of a scale's notes are computed once into a table (per scale, base
+# frequency, sample rate and sound) and a chord is the sum of rows of that table. WAV files
+# are written with the standard library's wave module as 16 bit mono PCM.
+SAMPLE_RATE = 44100
+HARMONICS = (1.0, 0.5, 0.25, 0.125)  # Amplitude of the fundamental and of each overtone
+_SYNTHESIS_ROWS = 64  # Chords summed at a time by synthesise
+
+
+# Function to compute (or reuse) the waveforms of the notes of a scale
+def note_table(scale_steps="2212221", f0=440, notes=64, sample_rate=SAMPLE_RATE, duration=1.5,
+               harmonics=HARMONICS, attack=0.02, release=0.3):
+    """
+    Waveforms of the first notes of a scale, with their envelope applied.
+
+    Args:
+        scale_steps (str): Step intervals for the scale, as for `scale`.
+        f0 (float): Base frequency (the scale's first note) in Hz.
+        notes (int): Number of notes needed; the table may hold more.
+        sample_rate (int): Samples per second.
+        duration (float): Length of each note in seconds.
+        harmonics (tuple): Amplitudes of the harmonics 1, 2, 3, ... of each note. Harmonics
+                           above the Nyquist frequency are left out.
+        attack (float): Seconds to fade each note in.
+        release (float): Seconds to fade each note out.
+
+    Returns:
+        np.ndarray: Read-only float32 array of shape (notes, samples), peaking at most at 1.
+    """
+    notes = -(-notes // 32) * 32  # Round up so nearby chords share one table
+    return _note_table(scale_steps, f0, notes, sample_rate, duration, tuple(harmonics),
+                       attack, release)
+
+
+@lru_cache(maxsize=8)
+def _note_table(scale_steps, f0, notes, sample_rate, duration, harmonics, attack, release):
+    n = np.array(scale(scale_steps, max_L=notes).n[:notes])
+    freqs = f0 * 2.0 ** (n / 12)
+    samples = int(round(duration * sample_rate))
+    t = np.arange(samples) / sample_rate
+    table = np.zeros((notes, samples))
+    for h, amplitude in enumerate(harmonics, start=1):
+        audible = freqs * h < sample_rate / 2
+        table[audible] += amplitude * np.sin(2 * np.pi * np.outer(freqs[audible] * h, t))
+    table /= sum(abs(a) for a in harmonics) or 1
+    envelope = np.ones(samples)
+    if attack > 0:
+        envelope = np.minimum(envelope, t / attack)
+    if release > 0:
+        envelope = np.minimum(envelope, (duration - t) / release)
+    table *= np.clip(envelope, 0, 1)
+    table = table.astype(np.float32)
+    table.setflags(write=False)
+    return table
+
+
+# Function to synthesise the chords of many spells at once
+def synthesise(spells, scale_steps="2212221", f0=440, sample_rate=SAMPLE_RATE, duration=1.5,
+               volume=0.8, **sound):
+    """
+    Synthesises the chord of each spell.
+
+    Args:
+        spells (list): Spells, as for chord_note_indices.
+        scale_steps (str): Step intervals for the scale (default is major scale).
+        f0 (float): Base frequency (default is 440 Hz).
+        sample_rate (int): Samples per second.
+        duration (float): Length of each chord in seconds.
+        volume (float): Peak amplitude of a chord, from 0 to 1.
+        **sound: harmonics, attack and release, passed to note_table.
+
+    Returns:
+        np.ndarray: float32 array of shape (len(spells), samples).
+    """
+    indices = chord_note_indices(spells)
+    table = note_table(scale_steps, f0, int(indices.max(initial=0)) + 1, sample_rate, duration,
+                       **sound)
+    # Sum the voices of a few rows at a time into the output, so besides it only a
+    # (rows, samples) block of table rows is ever allocated
+    out = np.empty((len(indices), table.shape[1]), dtype=table.dtype)
+    for start in range(0, len(indices), _SYNTHESIS_ROWS):
+        block = out[start:start + _SYNTHESIS_ROWS]
+        rows = indices[start:start + _SYNTHESIS_ROWS]
+        np.take(table, rows[:, 0], axis=0, out=block)
+        for voice in range(1, indices.shape[1]):
+            np.add(block, table[rows[:, voice]], out=block)
+    out *= volume / indices.shape[1]
+    return out
+
+
+# Function to write samples to a WAV file
+def write_wav(file, samples, sample_rate=SAMPLE_RATE):
+    """
+    Writes samples as a 16 bit mono WAV file.
+
+    Args:
+        file (str or file): Path, or binary file object, to write to.
+        samples (np.ndarray): Samples from -1 to 1; a 2D array is written row after row.
+        sample_rate (int): Samples per second.
+    """
+    with wave.open(file, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(_pcm16(samples))
+
+
+# Function to write the chord of every spell in a spellbook to its own WAV file
+def export_spellbook(spells, out_dir="spellbook", batch=64, **kwargs):
+    """
+    Synthesises the chord of each spell of a spellbook and writes it to a WAV file named
+    like the spell's image from writer.render_spellbook.
+
+    Args:
+        spells (list[dict] or str): Spells with the keys of writer.SPELL_FIELDS, or the
+                                    path of a CSV/JSONL spellbook to read them from.
+        out_dir (str): Directory the WAV files are written to.
+        batch (int): Number of spells synthesised at once, which bounds the memory used.
+        **kwargs: Passed to synthesise (scale_steps, f0, sample_rate, duration, ...).
+
+    Returns:
+        list: The files written, in spellbook order.
+    """
+    import writer
+    if isinstance(spells, str):
+        spells = writer.read_spellbook(spells)
+    os.makedirs(out_dir, exist_ok=True)
+    sample_rate = kwargs.get("sample_rate", SAMPLE_RATE)
+    written = []
+    for start in range(0, len(spells), batch):
+        chunk = spells[start:start + batch]
+        for i, (spell, samples) in enumerate(zip(chunk, synthesise(chunk, **kwargs)), start):
+            savename = writer._spell_savename(i, spell, out_dir, "wav")
+            write_wav(savename, samples, sample_rate)
+            written.append(savename)
+    return written
+
+
+# ---------Streaming Chord Sequences---------#
+# A long sequence of chords (a whole encounter or spellbook) is rendered as a generator of
+# fixed-size chunks instead of one array. Chords follow each other with an equal-power
+# crossfade; a few chords at a time are synthesised into a buffer holding at most one chunk
+# plus one chord, and every sample that no later chord overlaps is handed on, so the memory
+# used does not grow with the length of the sequence.
+def stream_chords(spells, chunk_size=4096, crossfade=0.1, batch=32, sample_rate=SAMPLE_RATE,
+                  duration=1.5, **kwargs):
+    """
+    Renders the chords of a sequence of spells back to back, chunk by chunk.
+
+    Args:
+        spells (iterable): Spells as for synthesise; may be a generator.
+        chunk_size (int): Samples per chunk. Every chunk but the last has exactly this many.
+        crossfade (float): Seconds by which consecutive chords overlap while one fades out
+                           and the next fades in.
+        batch (int): Number of chords synthesised at once.
+        sample_rate (int): Samples per second.
+        duration (float): Length of each chord in seconds, including the crossfades.
+        **kwargs: Passed to synthesise (scale_steps, f0, volume, harmonics, ...).
+
+    Yields:
+        np.ndarray: float32 chunks of samples.
+    """
+    length = int(round(duration * sample_rate))
+    overlap = int(round(crossfade * sample_rate))
+    if not 0 <= overlap < length:
+        raise ValueError("the crossfade must be shorter than a chord")
+    hop = length - overlap
+    ramp = np.sin(0.5 * np.pi * (np.arange(overlap) + 0.5) / max(overlap, 1)).astype(np.float32)
+
+    buffer = np.zeros(0, dtype=np.float32)  # samples from the first one not yet yielded
+    start = 0  # where the next chord starts in the buffer
+    spells = iter(spells)
+    while True:
+        chunk = list(itertools.islice(spells, batch))
+        if not chunk:
+            break
+        chords = synthesise(chunk, sample_rate=sample_rate, duration=duration, **kwargs)
+        if overlap:
+            chords[:, :overlap] *= ramp
+            chords[:, length - overlap:] *= ramp[::-1]
+        for chord in chords:
+            if len(buffer) < start + length:
+                buffer = np.concatenate([buffer, np.zeros(start + length - len(buffer), np.float32)])
+            buffer[start:start + length] += chord
+            start += hop
+            # Samples before `start` are complete: no later chord reaches back that far
+            while start >= chunk_size:
+                yield buffer[:chunk_size].copy()
+                buffer = buffer[chunk_size:]
+                start -= chunk_size
+    for i in range(0, len(buffer), chunk_size):
+        yield buffer[i:i + chunk_size].copy()
+
+
+# Function to write a sequence of chords to a WAV file as it is rendered
+def write_chord_stream(file, spells, duration=1.5, crossfade=0.1, sample_rate=SAMPLE_RATE,
+                       **kwargs):
+    """
+    Writes the chords of a sequence of spells, back to back, to one WAV file chunk by chunk
+    with stream_chords.
+
+    Args:
+        file (str or file): Path, or binary file object, to write to. A stream that cannot
+                            seek (e.g. a pipe) needs `spells` to be a list, so the length
+                            of the file is known before it is written.
+        spells (iterable): Spells as for synthesise.
+        duration, crossfade, sample_rate: As for stream_chords.
+        **kwargs: Passed to stream_chords (chunk_size, scale_steps, f0, ...).
+
+    Returns:
+        int: Number of samples written.
+    """
+    written = 0
+    with wave.open(file, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        if hasattr(spells, "__len__") and len(spells):
+            length = int(round(duration * sample_rate))
+            overlap = int(round(crossfade * sample_rate))
+            f.setnframes((len(spells) - 1) * (length - overlap) + length)
+        for chunk in stream_chords(spells, duration=duration, crossfade=crossfade,
+                                   sample_rate=sample_rate, **kwargs):
+            f.writeframesraw(_pcm16(chunk))
+            written += len(chunk)
+    return written
+
+
+def _pcm16(samples):
+    pcm = np.clip(np.asarray(samples, dtype=np.float32).reshape(-1), -1, 1) * 32767
+    return np.round(pcm).astype("<i2").tobytes()
 
 
 if __name__ == "__main__":
-    # Example scales
-    major = "2212221"  # Major scale intervals
-    minor = "2122122"  # Minor scale intervals
-    blues = "321132"  # Blues scale intervals
-
-    # Example base frequencies
-    A4 = 440  # Standard A4 frequency
-    Middle_C = 264  # Frequency of middle C
-
-    # Generate chords based on the given Attributes
-    f = chords_maker(
-        'point (150 feet)', '3', "sphere", "fire", "evocation",
-        scale_steps=blues, f0=Middle_C
-    )
-
-    # Convert and print the frequencies as note names
-    for f_ in f:
-        print(librosa.hz_to_note(f_))
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("spellbook", nargs="?",
+                        help="CSV/JSONL spellbook whose chords are written as WAV files "
+                             "(without it, the notes of an example chord are printed)")
+    parser.add_argument("-o", "--out-dir", default="spellbook", help="directory to write the WAV files to")
+    parser.add_argument("--scale", default="2212221", help="step intervals of the scale")
+    parser.add_argument("--f0", type=float, default=440, help="base frequency in Hz")
+    parser.add_argument("--duration", type=float, default=1.5, help="length of each chord in seconds")
+    parser.add_argument("--track", help="write every chord, back to back, to this one WAV file instead")
+    args = parser.parse_args()
+
+    if args.spellbook and args.track:
+        import writer
+        samples = write_chord_stream(args.track, writer.read_spellbook(args.spellbook),
+                                     duration=args.duration, scale_steps=args.scale, f0=args.f0)
+        print(f"{samples / SAMPLE_RATE:.1f} seconds written to {args.track}")
+    elif args.spellbook:
+        written = export_spellbook(args.spellbook, out_dir=args.out_dir, scale_steps=args.scale,
+                                   f0=args.f0, duration=args.duration)
+        print(f"{len(written)} chords written to {args.out_dir}")
+    else:
+        # Example scales
+        major = "2212221"  # Major scale intervals
+        minor = "2122122"  # Minor scale intervals
+        blues = "321132"  # Blues scale intervals
+
+        # Example base frequencies
+        A4 = 440  # Standard A4 frequency
+        Middle_C = 264  # Frequency of middle C
+
+        # Generate chords based on the given Attributes
+        f = chords_maker(
+            'point (150 feet)', '3', "sphere", "fire", "evocation",
+            scale_steps=blues, f0=Middle_C
+        )
+
+        # Convert and print the frequencies as note names
+        for f_ in f:
+            print(hz_to_note(f_))
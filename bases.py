@@ -4,6 +4,7 @@
 
 import numpy as np
 import math
+from functools import lru_cache
 
 
 def polygon(n, radius=1, start_angle=None):
@@ -20,7 +21,7 @@ def polygon(n, radius=1, start_angle=None):
     """
     if start_angle is None:
         start_angle = np.pi / n  # Default starting angle
-    small_angle = [start_angle + i * 2 * np.pi / n for i in np.arange(1, n + 1)]
+    small_angle = start_angle + np.arange(1, n + 1) * 2 * np.pi / n
     x, y = (radius * np.sin(small_angle), radius * np.cos(small_angle))
     return (x, y)
 
@@ -54,13 +55,8 @@ def quadratic(n, a=1, b=0, c=0):
     Returns:
         tuple: Two NumPy arrays (x, y) representing the coordinates.
     """
-    x = [0]
-    while len(x) < n:
-        if -x[-1] in x:
-            x.append(-x[-1] + 1)
-        else:
-            x.append(-x[-1])
-    x = np.array(x)
+    i = np.arange(n)
+    x = (i + 1) // 2 * np.where(i % 2, 1, -1)  # 0, 1, -1, 2, -2, ...
     y = a * x ** 2 + b * x + c
     return (x, y)
 
@@ -122,6 +118,45 @@ def golden(n, lim=3 * np.pi):
     return (x, y)
 
 
+# ---------Memoised Base Registry---------#
+# Bases by name, for menus and command lines, and a cache of generated points keyed by
+# (base, n, arguments), so glyphs and atlases sharing a configuration share its points.
+BASES = {"polygon": polygon, "line": line, "quadratic": quadratic, "circle": circle,
+         "cubic": cubic, "golden": golden}
+BASE_CACHE_SIZE = 256
+
+
+def points(base, n, *args, **kwargs):
+    """
+    Memoised x, y coordinates of a base.
+
+    Args:
+        base (str or callable): Name in BASES, or a base function such as polygon.
+        n (int): Number of points to generate.
+        *args, **kwargs: Further arguments of the base function.
+
+    Returns:
+        tuple: Two read-only NumPy arrays (x, y), shared by every caller.
+    """
+    fn = BASES[base] if isinstance(base, str) else base
+    try:
+        return _points(fn, n, args, tuple(sorted(kwargs.items())))
+    except TypeError:  # Unhashable arguments cannot be cached
+        return _read_only(fn(n, *args, **kwargs))
+
+
+@lru_cache(maxsize=BASE_CACHE_SIZE)
+def _points(fn, n, args, kwargs):
+    return _read_only(fn(n, *args, **dict(kwargs)))
+
+
+def _read_only(xy):
+    x, y = (np.asarray(v) for v in xy)
+    x.setflags(write=False)
+    y.setflags(write=False)
+    return (x, y)
+
+
 if __name__ == "__main__":
     # A simple test script to check the module is running
     print("Hello Nerd!")
@@ -0,0 +1,380 @@
+# ---------Benchmarks---------#
+# Times the parts of the project whose speed matters: enumerating the unique patterns,
+# generating the base points, loading the Uniques tables, drawing single glyphs, rendering spellbooks and answering the
+# web app's form. Results are written as JSON and compared with a stored baseline, and any
+# benchmark slower than the baseline by more than the threshold is reported as a regression.
+#
+#   python benchmarks.py                      run everything, compare with the baseline
+#   python benchmarks.py --only render,web    run some groups
+#   python benchmarks.py --save-baseline      store this run as the new baseline
+#   python benchmarks.py --check-startup      only check that start-up paths stay light
+#
+# Every benchmark runs in a temporary working directory (with a copy of Attributes/), so
+# the repository's own Uniques/ and static/ folders are neither used nor changed.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+GROUPS = ["startup", "enumeration", "bases", "cache", "render", "batch", "web"]
+DEFAULT_RESULTS = "benchmark_results.json"
+DEFAULT_BASELINE = os.path.join(REPO, "benchmark_baseline.json")
+
+MIN_RUN_TIME = 0.05  # seconds
+
+# Modules too slow to import for code paths that do not draw or play anything
+HEAVY_MODULES = ["matplotlib", "matplotlib.pyplot", "tqdm", "librosa"]
+
+# Commands run in a fresh interpreter by the startup benchmarks (in the working directory,
+# with the repository on the path): the interpreter alone, importing each module, and
+# listing an attribute with `writer.py -ah`
+STARTUP_COMMANDS = {
+    "startup/python": "pass",
+    "startup/import_writer": "import writer",
+    "startup/import_bard_spells": "import bard_spells",
+    "startup/import_app": "import app",
+    "startup/writer_list_attributes": "import runpy, sys; sys.argv = ['writer.py', '-ah', '-school', '1']; "
+                                      "runpy.run_module('writer', run_name='__main__')",
+}
+
+# A spell used by the render, batch and web benchmarks
+SPELL = dict(level="3", rang="150 feet", area="sphere (20)", dtype="fire", school="evocation")
+
+
+def measure(fn, repeat=5, number=None, setup=None):
+    """
+    Time fn() `number` times in a row, `repeat` times over.
+
+    Args:
+        fn (function): The code to time.
+        repeat (int): Number of timed runs.
+        number (int): Calls of fn per run; by default enough for a run to take at least
+                      MIN_RUN_TIME, so that fast code is not lost in the timer's noise.
+        setup (function): Called before each run, outside the timing.
+
+    Returns:
+        dict: Median and minimum seconds per call, with the number of runs.
+    """
+    if number is None:
+        number = 1
+        while True:
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            if time.perf_counter() - start >= MIN_RUN_TIME or setup is not None:
+                break
+            number *= 2
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return {"median": statistics.median(times), "min": min(times), "runs": repeat * number}
+
+
+def python(code):
+    # Runs `code` in a fresh interpreter, returning its output
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([REPO, os.environ.get("PYTHONPATH", "")]))
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True,
+                            text=True, check=True)
+    return result.stdout
+
+
+def bench_startup(quick=False):
+    # Wall time of starting an interpreter for each start-up path
+    return {name: measure(lambda: python(code), repeat=3 if quick else 7, number=1)
+            for name, code in STARTUP_COMMANDS.items()}
+
+
+def check_startup():
+    """
+    Check that the start-up paths of STARTUP_COMMANDS import none of HEAVY_MODULES.
+
+    Returns:
+        List[str]: A description of each path that does.
+    """
+    problems = []
+    for name, code in STARTUP_COMMANDS.items():
+        try:
+            output = python(f"{code}\nimport json, sys\n"
+                            f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))")
+        except subprocess.CalledProcessError as e:
+            problems.append(f"{name} fails: {(e.stderr.strip().splitlines() or ['?'])[-1]}")
+            continue
+        loaded = json.loads(output.strip().splitlines()[-1])
+        if loaded:
+            problems.append(f"{name} imports {', '.join(loaded)}")
+    return problems
+
+
+def bench_enumeration(quick=False):
+    # Enumerating every unique pattern of length N, as generate_unique_combinations does
+    import uniques
+    results = {}
+    for N in range(5, 15 if quick else 18):
+        results[f"enumeration/N={N}"] = measure(lambda: list(uniques.iter_unique_combinations(N)))
+    return results
+
+
+def bench_bases(quick=False):
+    # Generating the points of every base for a large glyph, bypassing the memoised registry
+    import bases
+    n = 5000 if quick else 50000
+    return {f"bases/{name}/n={n}": measure(lambda: fn(n)) for name, fn in bases.BASES.items()}
+
+
+def bench_cache(quick=False):
+    # Building a Uniques table, opening it from disk (cold) and reopening it in the same
+    # process (warm), then reading the rows of a spell
+    import uniques
+    results = {}
+    for N in (11, 13) if quick else (11, 13, 15, 17):
+        folder = tempfile.mkdtemp(prefix="uniques-", dir=".")
+
+        def clear(remove=False):
+            uniques._open_tables.clear()
+            if remove:
+                shutil.rmtree(folder)
+                os.makedirs(folder)
+        results[f"cache/build/N={N}"] = measure(lambda: uniques.open_table(N, folder),
+                                                setup=lambda: clear(remove=True))
+        results[f"cache/cold_load/N={N}"] = measure(lambda: uniques.open_table(N, folder),
+                                                    repeat=20, setup=clear)
+        results[f"cache/warm_load/N={N}"] = measure(lambda: uniques.open_table(N, folder))
+        table = uniques.open_table(N, folder)
+        results[f"cache/rows/N={N}"] = measure(lambda: table.rows([1, 2, 3, 4, 5, 6]))
+        shutil.rmtree(folder)
+    return results
+
+
+def bench_render(quick=False):
+    # Drawing one glyph as a PNG through matplotlib and as native SVG, for each base and
+    # connector; the geometry caches are warmed by a first, untimed render
+    import bases
+    import line_shapes
+    import writer
+    base_fns = {"polygon": (bases.polygon, []), "quadratic": (bases.quadratic, []),
+                "circle": (bases.circle, []), "golden": (bases.golden, [])}
+    shape_fns = {"straight": (line_shapes.straight, []),
+                 "centre_circle": (line_shapes.centre_circle, []),
+                 "non_centre_circle": (line_shapes.non_centre_circle, [-1.5])}
+    if quick:
+        base_fns = {"polygon": base_fns["polygon"]}
+    results = {}
+    for base_name, (base_fn, base_kwargs) in base_fns.items():
+        for shape_name, (shape_fn, shape_kwargs) in shape_fns.items():
+            kwargs = dict(SPELL, legend=True, base_fn=base_fn, base_kwargs=base_kwargs,
+                          shape_fn=shape_fn, shape_kwargs=shape_kwargs)
+            writer.render_spell(**kwargs)
+            results[f"render/png/{base_name}/{shape_name}"] = measure(
+                lambda: writer.render_spell(**kwargs), repeat=3 if quick else 5, number=1)
+            writer.spell_svg(**kwargs)
+            results[f"render/svg/{base_name}/{shape_name}"] = measure(
+                lambda: writer.spell_svg(**kwargs))
+    return results
+
+
+def bench_batch(quick=False, processes=2):
+    # Rendering a spellbook with render_spellbook; reported per spell, so lower is better
+    # like every other result
+    import writer
+    attrs = writer.registry.get_registry()
+    schools = attrs.values("school")
+    n_spells = 8 if quick else 32
+    spells = [{"level": SPELL["level"], "range": SPELL["rang"], "area": SPELL["area"],
+               "dtype": SPELL["dtype"], "school": schools[i % len(schools)], "title": f"spell {i}"}
+              for i in range(n_spells)]
+    out_dir = tempfile.mkdtemp(prefix="spellbook-", dir=".")
+    writer.uniques.open_table(13)  # built once, as by a previous run, and not timed
+    results = {}
+    for n in sorted({1, processes}):
+        result = measure(lambda: writer.render_spellbook(spells, out_dir=out_dir, processes=n,
+                                                         progress=False),
+                         repeat=1 if quick else 3, number=1)
+        for name in ("median", "min"):
+            result[name] /= n_spells
+        result["spells_per_second"] = 1 / result["min"]
+        results[f"batch/processes={n}"] = result
+    shutil.rmtree(out_dir)
+    return results
+
+
+def bench_web(quick=False):
+    # Latency of the form's POST /generate through Flask's test client: a render (cache
+    # miss) and an already rendered spell (cache hit)
+    import app
+    client = app.app.test_client()
+    attrs = app.attributes
+    form = {"level": SPELL["level"], "range": SPELL["rang"], "area": SPELL["area"],
+            "dtype": SPELL["dtype"], "school": SPELL["school"]}
+    client.post('/generate', data=form)  # warm up the registry, Uniques table and cache
+    levels = iter(attrs.values("levels") * 100)
+
+    def post(form):
+        response = client.post('/generate', data=form)
+        assert response.status_code == 200, response.status_code
+
+    def new_spell():
+        # The next level, with the rendered images deleted so each request is a miss
+        form["level"] = next(levels)
+        shutil.rmtree(app.render_cache.folder)
+        os.makedirs(os.path.join(app.render_cache.folder, ".locks"))
+    results = {"web/generate/miss": measure(lambda: post(form), repeat=3 if quick else 10,
+                                            setup=new_spell),
+               "web/generate/hit": measure(lambda: post(form))}
+    return results
+
+
+def run(groups, quick=False, processes=2):
+    """
+    Run the benchmark groups in a temporary working directory.
+
+    Returns:
+        dict: Results by benchmark name.
+    """
+    benches = {"startup": bench_startup, "enumeration": bench_enumeration, "bases": bench_bases,
+               "cache": bench_cache,
+               "render": bench_render, "batch": lambda quick: bench_batch(quick, processes),
+               "web": bench_web}
+    results = {}
+
+    def run_groups():
+        for group in groups:
+            print(f"--------{group}--------", flush=True)
+            for name, result in benches[group](quick).items():
+                print(f"{name:45s} {result['min'] * 1e3:10.3f} ms", flush=True)
+                results[name] = result
+    run_in_work_dir(run_groups)
+    return results
+
+
+def run_in_work_dir(fn):
+    # Calls fn() in a temporary working directory holding a copy of Attributes/
+    cwd = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="spell-benchmarks-")
+    try:
+        shutil.copytree(os.path.join(REPO, "Attributes"), os.path.join(work_dir, "Attributes"))
+        os.chdir(work_dir)
+        return fn()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def environment():
+    # What the numbers were measured on, stored with them
+    import matplotlib
+    import numpy
+    return {"python": platform.python_version(), "numpy": numpy.__version__,
+            "matplotlib": matplotlib.__version__, "machine": platform.machine(),
+            "system": platform.system(), "processor": platform.processor(),
+            "cpus": os.cpu_count(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def compare(results, baseline, threshold=0.25):
+    """
+    Compare results with a baseline by their fastest runs, which vary far less from run to
+    run than the medians on a busy machine.
+
+    Args:
+        results (dict): Results by benchmark name.
+        baseline (dict): Baseline results by benchmark name.
+        threshold (float): Relative slowdown counted as a regression (0.25 = 25% slower).
+
+    Returns:
+        List[tuple]: (name, baseline seconds, new seconds, ratio) of each regression.
+    """
+    regressions = []
+    print(f"{'benchmark':45s} {'baseline':>12s} {'now':>12s} {'ratio':>7s}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:45s} {'no baseline':>12s} {result['min'] * 1e3:10.3f}ms")
+            continue
+        old, new = baseline[name]["min"], result["min"]
+        ratio = new / old if old > 0 else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append((name, old, new, ratio))
+            flag = "  REGRESSION"
+        elif ratio < 1 / (1 + threshold):
+            flag = "  faster"
+        print(f"{name:45s} {old * 1e3:10.3f}ms {new * 1e3:10.3f}ms {ratio:7.2f}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time enumeration, Uniques tables, rendering, "
+                                                 "batch rendering and the web app")
+    parser.add_argument("--only", default=",".join(GROUPS),
+                        help=f"comma separated groups to run (default: {','.join(GROUPS)})")
+    parser.add_argument("-o", "--output", default=DEFAULT_RESULTS, help="JSON file for the results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="JSON file of the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown reported as a regression (default 0.25)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the results as the new baseline instead of comparing")
+    parser.add_argument("--quick", action="store_true", help="fewer sizes and repetitions")
+    parser.add_argument("-j", "--processes", type=int, default=2,
+                        help="worker processes for the batch benchmark (default 2)")
+    parser.add_argument("--check-startup", action="store_true",
+                        help=f"only check that importing the modules and listing attributes "
+                             f"loads none of {', '.join(HEAVY_MODULES)}")
+    args = parser.parse_args()
+
+    if args.check_startup:
+        problems = run_in_work_dir(check_startup)
+        for problem in problems:
+            print(problem)
+        print("Start-up paths are light" if not problems else "Start-up paths load heavy modules")
+        sys.exit(1 if problems else 0)
+
+    groups = [g.strip() for g in args.only.split(",") if g.strip()]
+    unknown = [g for g in groups if g not in GROUPS]
+    if unknown:
+        parser.error(f"unknown groups {unknown}; choose from {GROUPS}")
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    warnings.simplefilter("ignore")  # e.g. divisions by zero of degenerate connectors
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline)
+
+    results = run(groups, quick=args.quick, processes=args.processes)
+    problems = run_in_work_dir(check_startup) if "startup" in groups else []
+    for problem in problems:
+        print(f"Start-up regression: {problem}")
+    report = {"environment": environment(), "quick": args.quick, "results": results}
+    path = baseline_path if args.save_baseline else output
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Results written to {path}")
+
+    regressions = []
+    if not args.save_baseline:
+        if not os.path.isfile(baseline_path):
+            print(f"No baseline at {baseline_path}; store one with --save-baseline")
+        else:
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+            if baseline.get("quick") != args.quick:
+                print("Note: the baseline and this run differ in --quick")
+            regressions = compare(results, baseline["results"], args.threshold)
+            if regressions:
+                print(f"{len(regressions)} benchmarks are more than {args.threshold:.0%} slower "
+                      f"than the baseline")
+            else:
+                print("No regressions")
+    if regressions or problems:
+        sys.exit(1)
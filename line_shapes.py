@@ -119,3 +119,160 @@ def straight(P, Q):
     X = [P[0], Q[0]]
     Y = [P[1], Q[1]]
     return (X, Y)
+
+
+# Batched forms of the connectors above. Each takes the endpoints of many edges at once
+# as arrays and returns the curves of all of them stacked, one row per edge, making the
+# same arc choices as the single-edge version. They are attached to their single-edge
+# function as `.batch`; a custom shape function can provide one in the same way.
+def centre_circle_batch(P, Q, thetas=None):
+    """
+    Batched centre_circle.
+
+    Parameters:
+        P (array): Coordinates of the first points, shape (m, 2).
+        Q (array): Coordinates of the second points, shape (m, 2).
+        thetas (str, optional): If "Full", full circles are generated.
+
+    Returns:
+        tuple: Two arrays (X2, Y2) of shape (m, 150).
+    """
+    return _sample_arcs(*centre_circle_arc(P, Q, thetas))
+
+
+def centre_circle_arc(P, Q, thetas=None):
+    """
+    Circles and angles of the arcs drawn by centre_circle_batch, for output formats with
+    native arcs (such as SVG).
+
+    Parameters:
+        P (array): Coordinates of the first points, shape (m, 2).
+        Q (array): Coordinates of the second points, shape (m, 2).
+        thetas (str, optional): If "Full", full circles are described.
+
+    Returns:
+        tuple: Arrays (a, b, r, theta_start, theta_end) of shape (m,): the centres, radii
+               and the angles the arcs run from and to.
+    """
+    P = np.asarray(P, dtype=float)
+    Q = np.asarray(Q, dtype=float)
+    x1, y1 = P[:, 0], P[:, 1]
+    x2, y2 = Q[:, 0], Q[:, 1]
+
+    a = (x1 + x2) / 2
+    b = (y1 + y2) / 2
+    r = np.sqrt((a - x1) ** 2 + (b - y1) ** 2)
+
+    if thetas == "Full":
+        theta0, theta1 = np.zeros(len(P)), np.full(len(P), 2 * np.pi)
+    else:
+        theta0 = np.arctan2(y1 - b, x1 - a)
+        theta1 = np.arctan2(y2 - b, x2 - a)
+
+        # Ensure correct arc direction
+        flip = y2 < y1
+        theta0, theta1 = (np.where(flip, theta1 + np.pi, theta0),
+                          np.where(flip, theta0 + np.pi, theta1))
+    return (a, b, r, theta0, theta1)
+
+
+def non_centre_circle_batch(P, Q, b, thetas=None):
+    """
+    Batched non_centre_circle.
+
+    Parameters:
+        P (array): Coordinates of the first points, shape (m, 2).
+        Q (array): Coordinates of the second points, shape (m, 2).
+        b (float): Offset for the centres in the y-direction.
+        thetas (str, optional): If "Full", full circles are generated.
+
+    Returns:
+        tuple: Two arrays (X, Y) of shape (m, 150).
+    """
+    return _sample_arcs(*non_centre_circle_arc(P, Q, b, thetas))
+
+
+def non_centre_circle_arc(P, Q, b, thetas=None):
+    """
+    Circles and angles of the arcs drawn by non_centre_circle_batch, for output formats
+    with native arcs (such as SVG).
+
+    Parameters:
+        P (array): Coordinates of the first points, shape (m, 2).
+        Q (array): Coordinates of the second points, shape (m, 2).
+        b (float): Offset for the centres in the y-direction.
+        thetas (str, optional): If "Full", full circles are described.
+
+    Returns:
+        tuple: Arrays (a, b, r, theta_start, theta_end) of shape (m,).
+    """
+    P = np.asarray(P, dtype=float)
+    Q = np.asarray(Q, dtype=float)
+    x1, y1 = P[:, 0], P[:, 1]
+    x2, y2 = Q[:, 0], Q[:, 1]
+    b2 = -b
+
+    # Calculate potential centers and radius
+    delta = x1 ** 2 - x2 ** 2 + y1 ** 2 - y2 ** 2
+    a = (delta - 2 * (y1 - y2) * b) / (2 * (x1 - x2))
+    a2 = (delta - 2 * (y1 - y2) * b2) / (2 * (x1 - x2))
+    r = np.sqrt((x1 - a) ** 2 + (y1 - b) ** 2)
+    r2 = np.sqrt((x1 - a2) ** 2 + (y1 - b2) ** 2)
+
+    # Select the smaller arc and corresponding center
+    second = r2 <= r
+    a = np.where(second, a2, a)
+    b = np.where(second, b2, b)
+    r = np.where(second, r2, r)
+
+    if thetas == "Full":
+        return (a, b, r, np.zeros(len(P)), np.full(len(P), 2 * np.pi))
+    else:
+        theta0 = np.arctan2(y1 - b, x1 - a)
+        theta1 = np.arctan2(y2 - b, x2 - a)
+
+        # Ensure correct arc direction; atan2 lies in [-pi, pi], so one turn is enough
+        theta02, theta12 = theta0, theta1
+        theta0 = np.where(theta1 < theta0, theta0 - 2 * np.pi, theta0)
+        theta12 = np.where(theta02 < theta12, theta12 - 2 * np.pi, theta12)
+
+        arc1 = r * (theta1 - theta0)
+        arc2 = r * (theta02 - theta12)
+
+        # Select the smaller arc or based on center offset
+        first = (arc1 < arc2) | (np.sqrt(b ** 2) < 1)
+        return (a, b, r, np.where(first, theta1, theta02), np.where(first, theta0, theta12))
+
+
+def _sample_arcs(a, b, r, theta0, theta1):
+    # 150 points along each arc, as the single-edge connectors draw them
+    theta = np.linspace(theta0, theta1, 150, axis=-1)
+    X = r[:, None] * np.cos(theta) + a[:, None]
+    Y = r[:, None] * np.sin(theta) + b[:, None]
+    return (X, Y)
+
+
+def straight_batch(P, Q):
+    """
+    Batched straight.
+
+    Parameters:
+        P (array): Coordinates of the first points, shape (m, 2).
+        Q (array): Coordinates of the second points, shape (m, 2).
+
+    Returns:
+        tuple: Two arrays (X, Y) of shape (m, 2).
+    """
+    P = np.asarray(P)
+    Q = np.asarray(Q)
+    X = np.column_stack([P[:, 0], Q[:, 0]])
+    Y = np.column_stack([P[:, 1], Q[:, 1]])
+    return (X, Y)
+
+
+centre_circle.batch = centre_circle_batch
+non_centre_circle.batch = non_centre_circle_batch
+straight.batch = straight_batch
+# Connectors that draw circular arcs also describe them as `.arc`, used by writer's SVG output
+centre_circle.arc = centre_circle_arc
+non_centre_circle.arc = non_centre_circle_arc
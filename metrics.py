@@ -0,0 +1,127 @@
+# ---------Prometheus Metrics---------#
+# A small thread-safe collection of counters, gauges and summaries, written out in the
+# Prometheus text exposition format for a /metrics endpoint. It covers what the web app
+# publishes without depending on a Prometheus client library.
+
+import math
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Metrics():
+    def __init__(self, prefix=""):
+        """
+        Initialize an empty collection.
+
+        Args:
+            prefix (str): Prepended to every metric name (e.g. "spell_").
+        """
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._metrics = {}  # name -> (type, help, {labels: value}), in declaration order
+        self._readers = {}  # name -> function returning the metric's current value
+
+    def counter(self, name, help, value=None):
+        """
+        Declare a counter, increased with `inc`, or read from the function `value` when
+        the metrics are written (for counts kept elsewhere).
+        """
+        self._declare(name, "counter", help, value)
+
+    def summary(self, name, help):
+        """
+        Declare a summary (count and sum of observations), fed with `observe`.
+        """
+        self._declare(name, "summary", help)
+
+    def gauge(self, name, help, value=None):
+        """
+        Declare a gauge, set with `set`, or read from the function `value` when the
+        metrics are written.
+        """
+        self._declare(name, "gauge", help, value)
+
+    def inc(self, name, labels=None, amount=1):
+        """
+        Increase a counter, or add to a gauge.
+
+        Args:
+            name (str): The metric.
+            labels (dict): Label values of the series (e.g. {"status": "200"}).
+            amount (float): The increase.
+        """
+        key = _label_key(labels)
+        with self._lock:
+            values = self._metrics[name][2]
+            values[key] = values.get(key, 0) + amount
+
+    def set(self, name, value, labels=None):
+        """
+        Set a gauge.
+        """
+        with self._lock:
+            self._metrics[name][2][_label_key(labels)] = value
+
+    def observe(self, name, value, labels=None):
+        """
+        Record an observation (e.g. a duration in seconds) in a summary.
+        """
+        key = _label_key(labels)
+        with self._lock:
+            values = self._metrics[name][2]
+            count, total = values.get(key, (0, 0.0))
+            values[key] = (count + 1, total + value)
+
+    def render(self):
+        """
+        The metrics in the Prometheus text format.
+
+        Returns:
+            str: The exposition, served with CONTENT_TYPE.
+        """
+        read = {name: value() for name, value in self._readers.items()}
+        lines = []
+        with self._lock:
+            for name, (kind, help, values) in self._metrics.items():
+                full = self.prefix + name
+                lines.append(f"# HELP {full} {help}")
+                lines.append(f"# TYPE {full} {kind}")
+                if name in read:
+                    values = {(): read[name]}
+                for key, value in sorted(values.items()):
+                    labels = _format_labels(key)
+                    if kind == "summary":
+                        lines.append(f"{full}_count{labels} {value[0]}")
+                        lines.append(f"{full}_sum{labels} {_format_value(value[1])}")
+                    else:
+                        lines.append(f"{full}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _declare(self, name, kind, help, value=None):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = (kind, help, {})
+            if value is not None:
+                self._readers[name] = value
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in key)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(key, escaped)) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
@@ -0,0 +1,111 @@
+# ---------Streaming PNG Writer---------#
+# Writes a PNG image a band of rows at a time, so an image far larger than memory (e.g. a
+# spellbook atlas) can be produced from strips rendered one after another. Rows are
+# filtered with PNG's "Up" filter and compressed with zlib as they arrive; only the last
+# row of the previous band is kept. Uses only NumPy and the standard library.
+
+import struct
+import zlib
+
+import numpy as np
+
+_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_COLOR_TYPES = {1: 0, 3: 2, 4: 6}  # channels -> PNG colour type (grey, RGB, RGBA)
+_IDAT_SIZE = 2 ** 16  # Compressed bytes collected before an IDAT chunk is written
+
+
+class PNGWriter():
+    def __init__(self, file, width, height, channels=3, level=6, strategy=zlib.Z_DEFAULT_STRATEGY):
+        """
+        Start a PNG image of 8 bit samples.
+
+        Args:
+            file (str or file): Path, or binary file object, to write to.
+            width (int): Width in pixels.
+            height (int): Height in pixels; exactly this many rows must be written.
+            channels (int): 1 (grey), 3 (RGB) or 4 (RGBA).
+            level (int): zlib compression level.
+            strategy (int): zlib compression strategy; zlib.Z_RLE is faster for images
+                            that are mostly runs of one colour, such as single glyphs.
+        """
+        if channels not in _COLOR_TYPES:
+            raise ValueError(f"PNG images have 1, 3 or 4 channels, not {channels}")
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.rows_written = 0
+        self._own_file = isinstance(file, str)
+        self._file = open(file, "wb") if self._own_file else file
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 15, 8, strategy)
+        self._pending = []
+        self._pending_size = 0
+        self._previous = np.zeros((1, width * channels), dtype=np.uint8)
+        self._file.write(_SIGNATURE)
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8,
+                                         _COLOR_TYPES[channels], 0, 0, 0))
+
+    def write(self, rows):
+        """
+        Append rows to the image.
+
+        Args:
+            rows (np.ndarray): uint8 array of shape (rows, width, channels), or
+                               (rows, width) for grey images.
+        """
+        rows = np.asarray(rows, dtype=np.uint8).reshape(len(rows), -1)
+        if rows.shape[1] != self.width * self.channels:
+            raise ValueError(f"expected rows of {self.width} pixels with {self.channels} channels")
+        if self.rows_written + len(rows) > self.height:
+            raise ValueError(f"the image has only {self.height} rows")
+        if not len(rows):
+            return
+        # "Up" filter: each byte minus the byte above it, modulo 256
+        above = np.concatenate([self._previous, rows[:-1]])
+        filtered = np.empty((len(rows), rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        np.subtract(rows, above, out=filtered[:, 1:])
+        self._previous = rows[-1:].copy()
+        self._add(self._compressor.compress(filtered.tobytes()))
+        self.rows_written += len(rows)
+
+    def close(self):
+        """
+        Finish the image. Raises ValueError if fewer rows than `height` were written.
+        """
+        if self._compressor is None:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"{self.rows_written} of {self.height} rows were written")
+            self._add(self._compressor.flush(), flush=True)
+            self._chunk(b"IEND", b"")
+        finally:
+            self._compressor = None
+            if self._own_file:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._own_file:
+            self._compressor = None
+            self._file.close()
+        return False
+
+    def _add(self, data, flush=False):
+        if data:
+            self._pending.append(data)
+            self._pending_size += len(data)
+        if self._pending_size >= _IDAT_SIZE or (flush and self._pending):
+            self._chunk(b"IDAT", b"".join(self._pending))
+            self._pending = []
+            self._pending_size = 0
+
+    def _chunk(self, kind, data):
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(kind)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
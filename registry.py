@@ -0,0 +1,121 @@
+# ---------Shared Registry of Spell Attributes---------#
+# Loads the attribute lists in Attributes/ once per process and resolves attribute values
+# to their index with a dictionary lookup. A file is read again only when its modification
+# time changes, so edits to the lists are picked up without restarting the web app.
+
+import os
+import threading
+
+
+class AttributeRegistry():
+    def __init__(self, base_dir=""):
+        """
+        Initialize a registry for the attribute files in `base_dir`/Attributes/.
+
+        Args:
+            base_dir (str): Directory containing the Attributes folder (default is the
+                            working directory).
+        """
+        self.folder = os.path.join(base_dir, "Attributes")
+        self._entries = {}  # name -> (mtime, values, labels, lookup)
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        """
+        Path of the attribute file `name` (e.g. "range" for Attributes/range.txt).
+        """
+        return os.path.join(self.folder, f"{name}.txt")
+
+    def values(self, name):
+        """
+        Normalised (lowercase) values of an attribute, in file order.
+
+        Args:
+            name (str): Attribute file name without extension (e.g. "school").
+
+        Returns:
+            list: The values; the list is shared, so do not modify it.
+        """
+        return self._load(name)[1]
+
+    def labels(self, name):
+        """
+        Values of an attribute as written in the file, for display.
+        """
+        return self._load(name)[2]
+
+    def options(self, name):
+        """
+        (value, label) pairs of an attribute, for building dropdown menus.
+        """
+        entry = self._load(name)
+        return list(zip(entry[1], entry[2]))
+
+    def lookup(self, name):
+        """
+        Dictionary from normalised value to index of an attribute, for resolving many
+        values at once. The dictionary is shared and replaced (not modified) when the file
+        changes, so its identity tells whether the file was reloaded; do not modify it.
+        """
+        return self._load(name)[3]
+
+    def index(self, name, value):
+        """
+        Find the index of `value` in an attribute list.
+
+        Args:
+            name (str): Attribute file name without extension (e.g. "levels").
+            value: The attribute value; it is normalised like the file contents, so
+                   "Evocation", "evocation" and 3 for "3" are all accepted.
+
+        Returns:
+            int: Index of the value in the attribute file.
+
+        Raises:
+            ValueError: If the value is not in the attribute file.
+        """
+        lookup = self._load(name)[3]
+        try:
+            return lookup[normalise(value)]
+        except KeyError:
+            raise ValueError(f"{value!r} is not a valid option in {self.path(name)}") from None
+
+    def _load(self, name):
+        path = self.path(name)
+        mtime = os.stat(path).st_mtime_ns
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == mtime:
+            return entry
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry[0] != mtime:
+                with open(path, "r") as f:
+                    labels = [line.strip() for line in f.read().splitlines()]
+                values = [normalise(label) for label in labels]
+                lookup = {}
+                for i, value in enumerate(values):
+                    lookup.setdefault(value, i)  # First occurrence wins, as with list.index
+                entry = (mtime, values, labels, lookup)
+                self._entries[name] = entry
+        return entry
+
+
+def normalise(value):
+    """
+    Normalise an attribute value the way the attribute files are read: as a stripped,
+    lowercase string.
+    """
+    return str(value).strip().lower()
+
+
+_registries = {}
+
+
+def get_registry(base_dir=""):
+    """
+    Return the registry shared by every caller for `base_dir`, creating it on first use.
+    """
+    registry = _registries.get(base_dir)
+    if registry is None:
+        registry = _registries.setdefault(base_dir, AttributeRegistry(base_dir))
+    return registry
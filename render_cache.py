@@ -0,0 +1,180 @@
+# ---------Content-addressed Cache of Rendered Spells---------#
+# Rendered images are stored under a hash of the normalised spell attributes, the indices
+# they resolve to in the attribute files and the rendering options, so an identical spell
+# is only ever rendered once, and editing an attribute file (which changes the glyph of a
+# value) gives its spells new keys rather than serving their old images. Concurrent requests for the
+# same image wait for a single render, and the least recently used images are deleted once
+# the cache grows past its byte budget.
+
+import hashlib
+import json
+import os
+import threading
+
+from locking import atomic_write, file_lock
+from registry import normalise
+
+CACHE_VERSION = 1  # Bump when the rendering changes so old images are not served.
+
+
+class RenderCache():
+    def __init__(self, folder, max_bytes=256 * 2 ** 20, registry=None):
+        """
+        Initialize a render cache.
+
+        Args:
+            folder (str): Directory holding the cached images (created if needed).
+            max_bytes (int): Total size of the images to keep before evicting.
+            registry (AttributeRegistry): Registry the attribute values are resolved with;
+                                          keys then cover each value's index, which
+                                          decides its glyph.
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.registry = registry
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(folder, ".locks"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._size = None  # Estimate of the bytes in the folder, refreshed when evicting
+
+    def key(self, attributes, options=None):
+        """
+        Content address of a rendering.
+
+        Args:
+            attributes (dict): Spell attributes by attribute file name (e.g. "school");
+                               values are normalised like the attribute files, so
+                               "Evocation" and "evocation" share an entry.
+            options (dict): Rendering options (format, dpi, legend, ...).
+
+        Returns:
+            str: A hexadecimal digest, used as the file name.
+
+        Raises:
+            ValueError: If the cache has a registry and a value is not in its file.
+        """
+        content = {"version": CACHE_VERSION,
+                   "attributes": {name: normalise(value) for name, value in attributes.items()},
+                   "options": options or {}}
+        if self.registry is not None:
+            content["indices"] = {name: self.registry.index(name, value)
+                                  for name, value in attributes.items()}
+        text = json.dumps(content, sort_keys=True, default=str)
+        return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+    def filename(self, key, fmt="png"):
+        return f"{key}.{fmt}"
+
+    def path(self, key, fmt="png"):
+        return os.path.join(self.folder, self.filename(key, fmt))
+
+    def get(self, key, render, fmt="png"):
+        """
+        Return the path of the cached image for `key`, rendering it on a miss.
+        Identical requests arriving while the image is being rendered, from this or any
+        other process sharing the folder, wait for that render instead of starting their
+        own.
+
+        Args:
+            key (str): Content address from `key`.
+            render (function): Called with no arguments on a miss; returns the image bytes.
+            fmt (str): File extension of the image.
+
+        Returns:
+            str: Path of the image.
+        """
+        path = self.path(key, fmt)
+        if self._touch(path):
+            self._count(hit=True)
+            return path
+        with self._lock:
+            key_lock = self._key_locks.setdefault(path, threading.Lock())
+        try:
+            # Locked per image, so renders of different spells never wait for each other
+            with key_lock, file_lock(self._lock_path(path)):
+                if self._touch(path):
+                    self._count(hit=True)
+                    return path
+                self._count(hit=False)
+                data = render()
+                atomic_write(path, data)
+        finally:
+            with self._lock:
+                self._key_locks.pop(path, None)
+        self._added(path, len(data))
+        return path
+
+    def _count(self, hit):
+        # Counted under the lock: the counters are shared by every request thread
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _lock_path(self, path):
+        return os.path.join(self.folder, ".locks", os.path.basename(path) + ".lock")
+
+    def _touch(self, path):
+        # Marks a cached file as recently used; False if it is not cached.
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def _added(self, path, nbytes):
+        with self._lock:
+            if self._size is not None:
+                self._size += nbytes
+            if self._size is None or self._size > self.max_bytes:
+                self._size = self._evict(keep=path)
+
+    def _evict(self, keep=None):
+        # Deletes least recently used images, with their lock files, until the folder fits
+        # the budget, sparing `keep`, the image about to be served. Should an evicted image
+        # be requested again while its lock file is deleted, it may be rendered twice,
+        # which atomic_write makes harmless.
+        entries = []
+        for entry in os.scandir(self.folder):
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+            try:
+                os.remove(self._lock_path(path))
+            except OSError:
+                pass
+        return total
+
+
+if __name__ == "__main__":
+    # Check that editing an attribute file gives its spells new keys.
+    import tempfile
+    from registry import AttributeRegistry
+    with tempfile.TemporaryDirectory() as base_dir:
+        os.makedirs(os.path.join(base_dir, "Attributes"))
+        registry = AttributeRegistry(base_dir)
+        cache = RenderCache(os.path.join(base_dir, "cache"), registry=registry)
+        with open(registry.path("school"), "w") as f:
+            f.write("Abjuration\nEvocation\n")
+        before = cache.key({"school": "evocation"})
+        assert cache.key({"school": "Evocation"}) == before
+        with open(registry.path("school"), "w") as f:
+            f.write("Evocation\nAbjuration\n")
+        os.utime(registry.path("school"), ns=(0, 0))  # A new mtime, however coarse the clock
+        after = cache.key({"school": "evocation"})
+        assert after != before, "an edited attribute file kept the old key"
+        print(f"key before the edit {before}, after {after}")
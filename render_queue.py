@@ -0,0 +1,115 @@
+# ---------Bounded Queue of Background Renders---------#
+# Runs slow renders on a small pool of local worker threads or processes instead of inside
+# the request that asked for them. Each job has an id chosen by the caller (the web app
+# uses the render cache key, so a spell is only ever queued once), its state can be polled,
+# and new jobs are refused once max_pending jobs are queued or running, so a burst of
+# requests cannot pile up without limit. No external broker is needed.
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    """
+    Raised by RenderQueue.submit when max_pending jobs are already queued or running.
+    """
+
+
+class RenderQueue():
+    def __init__(self, workers=2, max_pending=32, processes=False, history=1024):
+        """
+        Initialize a render queue. The workers are started by the first submitted job.
+
+        Args:
+            workers (int): Number of renders run at once.
+            max_pending (int): Number of jobs that may be queued or running at once.
+            processes (bool): Run the jobs in worker processes instead of threads; the job
+                              function and its arguments must then be picklable.
+            history (int): Number of finished jobs whose outcome is remembered.
+        """
+        self.workers = workers
+        self.max_pending = max_pending
+        self.processes = processes
+        self.history = history
+        self._executor = None
+        self._jobs = {}  # id -> Future of the queued and running jobs
+        self._finished = OrderedDict()  # id -> error message (None on success), oldest first
+        self._lock = threading.RLock()  # a job that is already done runs its callback in submit
+
+    @property
+    def pending(self):
+        """
+        Number of jobs queued or running.
+        """
+        return len(self._jobs)
+
+    def submit(self, job_id, fn, *args):
+        """
+        Queue fn(*args) under `job_id`, unless a job with that id is already queued or
+        running, in which case that job is kept.
+
+        Args:
+            job_id (str): Identifier used to poll the job.
+            fn (function): The render; its return value is discarded, so it should store
+                           its result itself (e.g. in a RenderCache).
+
+        Returns:
+            str: State of the job, as from `status`.
+
+        Raises:
+            QueueFull: If max_pending jobs are already queued or running.
+        """
+        with self._lock:
+            if job_id not in self._jobs:
+                if len(self._jobs) >= self.max_pending:
+                    raise QueueFull(f"{len(self._jobs)} renders are already queued")
+                if self._executor is None:
+                    pool = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+                    self._executor = pool(max_workers=self.workers)
+                self._finished.pop(job_id, None)
+                future = self._executor.submit(fn, *args)
+                self._jobs[job_id] = future
+                future.add_done_callback(lambda future: self._done(job_id, future))
+        return self.status(job_id)[0]
+
+    def status(self, job_id):
+        """
+        State of a job.
+
+        Returns:
+            tuple: (state, error), where state is "queued", "running", "done" or "failed"
+                   and error describes the failure; None if the job is unknown (never
+                   submitted, or finished longer ago than the history remembers).
+        """
+        with self._lock:
+            future = self._jobs.get(job_id)
+            if future is not None:
+                return ("running" if future.running() else "queued", None)
+            if job_id in self._finished:
+                error = self._finished[job_id]
+                return ("done", None) if error is None else ("failed", error)
+        return None
+
+    def shutdown(self, wait=True):
+        """
+        Stop the workers, after the queued jobs when `wait` is True.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def _done(self, job_id, future):
+        error = None
+        if future.cancelled():
+            error = "cancelled"
+        elif future.exception() is not None:
+            e = future.exception()
+            error = f"{type(e).__name__}: {e}"
+        with self._lock:
+            if self._jobs.get(job_id) is future:
+                del self._jobs[job_id]
+            self._finished[job_id] = error
+            while len(self._finished) > self.history:
+                self._finished.popitem(last=False)
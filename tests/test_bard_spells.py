@@ -0,0 +1,22 @@
+import numpy as np
+
+import bard_spells
+from registry import get_registry
+
+
+def spell_values(indices):
+    # Attribute values of (range, level, area, dtype, school) indices
+    attrs = get_registry()
+    return [attrs.values(name)[i] for name, i in zip(bard_spells.CHORD_ATTRIBUTES, indices)]
+
+
+def test_index_tuples_match_chords_maker():
+    attrs = get_registry()
+    lens = [len(attrs.values(name)) for name in bard_spells.CHORD_ATTRIBUTES]
+    rng = np.random.default_rng(0)
+    spells = [tuple(int(rng.integers(n)) for n in lens) for _ in range(50)]
+    spells += [(0, 0, 0, 0, 0), tuple(n - 1 for n in lens)]
+    expected = np.array([bard_spells.chords_maker(*spell_values(spell)) for spell in spells])
+    assert np.array_equal(bard_spells.chords_batch(spells), expected)
+    assert np.array_equal(bard_spells.chords_batch(np.array(spells)), expected)
+    assert np.array_equal(bard_spells.chords_batch([spell_values(s) for s in spells]), expected)
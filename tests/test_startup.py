@@ -0,0 +1,16 @@
+import json
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ["matplotlib", "tqdm", "librosa"]
+
+
+def test_imports_skip_heavy_modules(repo_root):
+    # A fresh interpreter, since this one may already have imported them
+    code = ("import json, sys\nimport writer, app\n"
+            f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([repo_root, os.environ.get("PYTHONPATH", "")]))
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True,
+                            text=True, check=True)
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
@@ -0,0 +1,37 @@
+# The enumeration engine must give exactly the patterns, in the same order, as the original
+# brute force search, since spell glyphs index into these tables.
+import os
+
+import numpy as np
+import pytest
+
+import uniques
+import writer
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+@pytest.mark.parametrize("L", range(3, 14))
+def test_matches_reference_search(L):
+    expected = uniques._reference_unique_combinations(L)
+    assert list(uniques.iter_unique_combinations(L)) == expected
+    assert writer.generate_unique_combinations(L) == expected
+    assert uniques.unique_count(L) == len(expected)
+    assert all(uniques.rank(p) == i and uniques.unrank(i, L) == p for i, p in enumerate(expected))
+
+
+@pytest.mark.parametrize("L", [11, 13])
+def test_matches_saved_tables(L):
+    # uniques_{L}.npy were saved by the original generate_unique_combinations
+    expected = np.load(os.path.join(DATA, f"uniques_{L}.npy"))
+    assert np.array_equal(np.array(list(uniques.iter_unique_combinations(L))), expected)
+    assert np.array_equal(np.array(writer.generate_unique_combinations(L)), expected)
+
+
+@pytest.mark.parametrize("L", [11, 13])
+def test_matches_local_uniques_folder(L):
+    # Tables a deployment already saved in Uniques/ must still be the ones produced now
+    path = os.path.join("Uniques", f"{L}.npy")
+    if not os.path.exists(path):
+        pytest.skip(f"no {path}")
+    assert np.array_equal(np.load(path), np.array(list(uniques.iter_unique_combinations(L))))
@@ -0,0 +1,65 @@
+# ---------Timing Spans and Hooks---------#
+# writer.py wraps each stage of drawing a spell (attribute lookup, Uniques patterns,
+# geometry, drawing, encoding, ...) in a named span. Functions installed with add_hook are
+# called with the name and duration of every span as it ends, e.g. to publish them as
+# metrics. Without any hook installed a span does nothing but return a shared no-op context
+# manager, so the instrumentation costs next to nothing.
+#
+# Spans nest: "draw" includes the "geometry" of the glyph it draws, and "render" includes
+# every stage of a render_spell call.
+
+import time
+from contextlib import nullcontext
+
+_hooks = ()  # Replaced rather than modified, so spans can read it without a lock
+_NO_SPAN = nullcontext()
+
+
+def add_hook(hook):
+    """
+    Install a function called as hook(name, seconds) whenever a span ends, in the thread
+    that ran it. Hooks should be quick and must not raise.
+
+    Returns:
+        The hook, so this can be used as a decorator.
+    """
+    global _hooks
+    _hooks = _hooks + (hook,)
+    return hook
+
+
+def remove_hook(hook):
+    """
+    Uninstall a hook added with add_hook.
+    """
+    global _hooks
+    _hooks = tuple(h for h in _hooks if h is not hook)
+
+
+def span(name):
+    """
+    Context manager timing the block it wraps as the span `name`:
+
+        with timing.span("encode"):
+            fig.savefig(...)
+    """
+    if not _hooks:
+        return _NO_SPAN
+    return _Span(name)
+
+
+class _Span():
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        for hook in _hooks:
+            hook(self.name, seconds)
+        return False
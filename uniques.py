@@ -0,0 +1,457 @@
+# uniques.py - Enumeration of rotationally unique binary patterns.
+# A pattern and all of its cyclic rotations draw the same rune, so only one member of each
+# rotation class is kept. The member kept is the first one met when counting upwards in
+# binary, i.e. the smallest rotation (a "necklace"), and the classes are listed in increasing
+# order of that member. This is the order the spell glyphs have always used.
+import os
+import struct
+import tempfile
+from functools import lru_cache
+
+import numpy as np
+
+from locking import file_lock
+
+
+def rotate(value, L, shift=1):
+    """
+    Cyclically rotates the `L` bit integer `value` left by `shift` positions.
+    """
+    shift %= L
+    mask = (1 << L) - 1
+    return ((value << shift) | (value >> (L - shift))) & mask
+
+
+def canonical(value, L):
+    """
+    Returns the smallest rotation of the `L` bit integer `value`.
+    This is the representative of its rotation class used in the Uniques tables.
+    """
+    best = value
+    for shift in range(1, L):
+        value = rotate(value, L)
+        if value < best:
+            best = value
+    return best
+
+
+def canonical_array(bits):
+    """
+    Vectorised `canonical` for many patterns at once.
+    Args:
+        bits (array-like): 0/1 array of shape (..., L) with one pattern, most significant
+                           bit first, along the last axis (L <= 63).
+    Returns:
+        np.ndarray: int64 array of shape (...) holding the smallest rotation of each
+                    pattern as an integer.
+    """
+    bits = np.asarray(bits)
+    L = bits.shape[-1]
+    if L > 63:
+        raise ValueError(f"patterns of {L} bits do not fit a 64 bit integer")
+    weights = np.left_shift(1, np.arange(L - 1, -1, -1, dtype=np.int64))
+    value = ((bits != 0) * weights).sum(axis=-1, dtype=np.int64)
+    mask = (1 << L) - 1
+    best = value.copy()
+    for shift in range(1, L):
+        np.minimum(best, ((value << shift) | (value >> (L - shift))) & mask, out=best)
+    return best
+
+
+def to_int(pattern):
+    """
+    Converts a binary pattern (most significant bit first) to an integer.
+    """
+    value = 0
+    for bit in pattern:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def to_bits(value, L):
+    """
+    Converts an integer to a list of `L` bits, most significant bit first.
+    """
+    return [(value >> (L - 1 - i)) & 1 for i in range(L)]
+
+
+def unique_count(L):
+    """
+    Number of rotationally unique binary patterns of length `L` (binary necklaces).
+    """
+    total = 0
+    for d in range(1, L + 1):
+        if L % d == 0:
+            total += _totient(L // d) * 2 ** d
+    return total // L
+
+
+def iter_unique_combinations(L, start=0, stop=None):
+    """
+    Yields the rotationally unique binary patterns of length `L` as lists of ints.
+    Uses the Fredricksen-Kessler-Maiorana algorithm, which visits necklaces in
+    lexicographic order, so the output matches the original brute force search
+    pattern for pattern at a constant amortised cost per pattern. A slice of the table
+    starts from its first pattern, found with unrank, so slices can be generated
+    independently (e.g. in parallel) and joined in order.
+    Args:
+        L (int): The length of binary patterns to generate.
+        start (int): Row of the Uniques table to start from.
+        stop (int, optional): Row to stop before (default: the end of the table).
+    Yields:
+        List[int]: The next unique pattern.
+    """
+    remaining = (unique_count(L) if stop is None else stop) - start
+    if remaining <= 0:
+        return
+    a = unrank(start, L) if start else [0] * L
+    p = 1  # Length of the longest prefix of a that is a Lyndon word
+    for i in range(1, L):
+        if a[i - p] < a[i]:
+            p = i + 1
+    while True:
+        if L % p == 0:
+            yield list(a)
+            remaining -= 1
+            if not remaining:
+                return
+        i = L - 1
+        while i >= 0 and a[i] == 1:
+            i -= 1
+        if i < 0:
+            return
+        a[i] = 1
+        for j in range(i + 1, L):
+            a[j] = a[j - i - 1]
+        p = i + 1
+
+
+def pack_patterns(patterns, block_size=65536):
+    """
+    Packs patterns into table rows of ceil(L / 8) bytes, as stored in the cache files.
+    Args:
+        patterns (iterable): Binary patterns, most significant bit first.
+        block_size (int): Rows per block.
+    Yields:
+        np.ndarray: uint8 blocks of at most `block_size` packed rows, in order.
+    """
+    chunk = []
+    for pattern in patterns:
+        chunk.append(pattern)
+        if len(chunk) == block_size:
+            yield np.packbits(np.array(chunk, dtype=np.uint8), axis=1)
+            chunk = []
+    if chunk:
+        yield np.packbits(np.array(chunk, dtype=np.uint8), axis=1)
+
+
+def rank(pattern):
+    """
+    Returns the index of `pattern` in the Uniques table for its length, without building
+    the table. Any rotation of a table row gives that row's index.
+    Args:
+        pattern (list[int]): Binary pattern, most significant bit first.
+    Returns:
+        int: The row of generate_unique_combinations(len(pattern)) in its rotation class.
+    """
+    L = len(pattern)
+    return _count_below(canonical(to_int(pattern), L), L)
+
+
+def unrank(i, L):
+    """
+    Returns the `i`-th rotationally unique binary pattern of length `L`, without building
+    the table. This is the inverse of rank, found bit by bit from the most significant end
+    as the largest pattern with at most `i` unique patterns below it.
+    Args:
+        i (int): Row of the Uniques table.
+        L (int): The length of the pattern.
+    Returns:
+        List[int]: The pattern, identical to generate_unique_combinations(L)[i].
+    """
+    if not 0 <= i < unique_count(L):
+        raise IndexError(f"pattern index {i} out of range for {L} bits")
+    value = 0
+    for bit in range(L - 1, -1, -1):
+        if _count_below(value | (1 << bit), L) <= i:
+            value |= 1 << bit
+    return to_bits(value, L)
+
+
+#---------Uniques table cache------
+# Tables are stored as Uniques/{L}.uniq: a fixed size header followed by one row per
+# pattern, each packed into ceil(L / 8) bytes. Files are memory-mapped, so a lookup only
+# reads the rows it needs, and are written to a temporary file that is renamed into place
+# while holding a lock file, so any number of processes can share one cache directory.
+CACHE_FORMAT_VERSION = 1
+GENERATOR_VERSION = 1  # Bump when the enumeration order changes to invalidate old tables.
+_HEADER = struct.Struct("<4sHHIQ")
+_HEADER_SIZE = 32
+_MAGIC = b"UNIQ"
+_open_tables = {}
+
+
+class UniquesTable():
+    def __init__(self, path, L, count, packed):
+        """
+        A memory-mapped table of rotationally unique binary patterns.
+
+        Args:
+            path (str): File the table was opened from.
+            L (int): The length of the patterns.
+            count (int): Number of patterns in the table.
+            packed (np.memmap): The bit-packed rows, shape (count, ceil(L / 8)).
+        """
+        self.path = path
+        self.L = L
+        self.count = count
+        self.packed = packed
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return self.rows([i])[0]
+
+    def rows(self, indices):
+        """
+        Unpacks the rows `indices` of the table.
+
+        Returns:
+            np.ndarray: Array of shape (len(indices), L) holding the patterns as 0/1 ints.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if np.any((indices < 0) | (indices >= self.count)):
+            raise IndexError(f"pattern index out of range for {self.L} bits")
+        bits = np.unpackbits(self.packed[indices], axis=1)[:, :self.L]
+        return bits.astype(np.int64)
+
+
+def cache_path(L, cache_dir="Uniques/"):
+    """
+    Path of the cached table for patterns of length `L`.
+    """
+    return os.path.join(cache_dir, f"{L}.uniq")
+
+
+def open_table(L, cache_dir="Uniques/", build=True):
+    """
+    Opens the cached table for patterns of length `L`, memory-mapped.
+    Tables are kept open per process and reopened only when the file is replaced.
+    Args:
+        L (int): The length of the patterns.
+        cache_dir (str): Directory holding the cache files.
+        build (bool): Build and save the table if it is missing or out of date.
+    Returns:
+        UniquesTable or None: The table, or None if it is not cached and `build` is False.
+    """
+    path = cache_path(L, cache_dir)
+    table = _open_cached(path, L)
+    if table is None and build:
+        write_table(L, cache_dir)
+        table = _open_cached(path, L)
+    return table
+
+
+def write_table(L, cache_dir="Uniques/", patterns=None, packed=None):
+    """
+    Builds the table for patterns of length `L` and saves it atomically.
+    The lock file serialises writers, so if another process finished the table while
+    this one waited, its file is kept rather than generated again.
+    Args:
+        L (int): The length of the patterns.
+        cache_dir (str): Directory holding the cache files.
+        patterns (iterable, optional): The patterns in table order, if already generated.
+        packed (iterable, optional): The rows already packed (see pack_patterns), as
+                                     uint8 arrays of shape (rows, ceil(L / 8)) in order.
+    Returns:
+        str: Path of the table.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path(L, cache_dir)
+    with file_lock(path + ".lock"):
+        if _read_header(path, L) is not None:
+            return path
+        if packed is None:
+            packed = pack_patterns(iter_unique_combinations(L) if patterns is None else patterns)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=f".{L}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(b"\0" * _HEADER_SIZE)
+                count = 0
+                for block in packed:
+                    block = np.asarray(block, dtype=np.uint8)
+                    if block.ndim != 2 or block.shape[1] != _row_bytes(L):
+                        raise ValueError(f"packed rows of {L} bits have {_row_bytes(L)} bytes")
+                    f.write(block.tobytes())
+                    count += len(block)
+                f.seek(0)
+                f.write(_HEADER.pack(_MAGIC, CACHE_FORMAT_VERSION, GENERATOR_VERSION, L, count))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return path
+
+
+def _row_bytes(L):
+    return (L + 7) // 8
+
+
+def _read_header(path, L):
+    # Returns the pattern count of a complete, current table at `path`, otherwise None.
+    try:
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+            size = os.fstat(f.fileno()).st_size
+    except OSError:
+        return None
+    if len(header) != _HEADER.size:
+        return None
+    magic, fmt, gen, n, count = _HEADER.unpack(header)
+    if (magic, fmt, gen, n) != (_MAGIC, CACHE_FORMAT_VERSION, GENERATOR_VERSION, L):
+        return None
+    if size != _HEADER_SIZE + count * _row_bytes(L):
+        return None
+    return count
+
+
+def _open_cached(path, L):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    if path in _open_tables and _open_tables[path][0] == key:
+        return _open_tables[path][1]
+    count = _read_header(path, L)
+    if count is None:
+        return None
+    packed = np.memmap(path, dtype=np.uint8, mode="r", offset=_HEADER_SIZE,
+                       shape=(count, _row_bytes(L)))
+    table = UniquesTable(path, L, count, packed)
+    _open_tables[path] = (key, table)
+    return table
+
+
+def _totient(n):
+    result = n
+    m = n
+    p = 2
+    while p * p <= m:
+        if m % p == 0:
+            while m % p == 0:
+                m //= p
+            result -= result // p
+        p += 1
+    if m > 1:
+        result -= result // m
+    return result
+
+
+@lru_cache(maxsize=4096)
+def _count_all_rotations_at_least(theta, t):
+    # Number of t bit strings whose every rotation is >= the t bit string theta.
+    # A rotation drops below theta exactly when it reads theta[:i] followed by a 0 where
+    # theta has a 1, so the strings are counted by walking an Aho-Corasick automaton over
+    # the prefixes of theta around the cycle and keeping walks that return to their start.
+    bits = [(theta >> (t - 1 - i)) & 1 for i in range(t)]
+    fail = [0] * (t + 1)
+    k = 0
+    for i in range(1, t):
+        while k and bits[i] != bits[k]:
+            k = fail[k]
+        if bits[i] == bits[k]:
+            k += 1
+        fail[i + 1] = k
+    step = []
+    for q in range(t + 1):
+        row = []
+        for c in (0, 1):
+            forbidden = False
+            j = q
+            while True:
+                if j < t and bits[j] == 1 and c == 0:
+                    forbidden = True
+                    break
+                if j == 0:
+                    break
+                j = fail[j]
+            if forbidden:
+                row.append(None)
+                continue
+            j = q
+            while j == t or (j and bits[j] != c):
+                j = fail[j]
+            row.append(j + 1 if bits[j] == c else 0)
+        step.append(row)
+    total = 0
+    for start in range(t + 1):
+        counts = [0] * (t + 1)
+        counts[start] = 1
+        for _ in range(t):
+            nxt = [0] * (t + 1)
+            for q, n in enumerate(counts):
+                if n:
+                    for target in step[q]:
+                        if target is not None:
+                            nxt[target] += n
+            counts = nxt
+        total += counts[start]
+    return total
+
+
+def _count_below(alpha, L):
+    # Number of unique patterns of length L smaller than the L bit integer alpha.
+    # By Burnside's lemma this averages, over the rotations, the number of strings fixed by
+    # the rotation whose smallest rotation is below alpha. A string fixed by a rotation with
+    # gcd d is a d bit block repeated, and the repeated block is below alpha exactly when
+    # the block is below alpha's first d bits (or equal to them, if repeating them falls
+    # short of alpha).
+    def below(theta, t):
+        # Number of t bit strings with some rotation below theta.
+        if theta >= 1 << t:
+            return 2 ** t
+        return 2 ** t - _count_all_rotations_at_least(theta, t)
+
+    total = 0
+    for d in range(1, L + 1):
+        if L % d:
+            continue
+        prefix = alpha >> (L - d)
+        repeated = 0
+        for _ in range(L // d):
+            repeated = (repeated << d) | prefix
+        count = below(prefix, d)
+        if repeated < alpha:
+            count = below(prefix + 1, d)
+        total += _totient(L // d) * count
+    return total // L
+
+
+def _reference_unique_combinations(L):
+    # The original brute force search, kept to check the fast engine against
+    # (see tests/test_uniques.py).
+    def cycle(l):
+        return l[1:] + l[:1]
+
+    combinations = [to_bits(v, L) for v in range(2 ** L)]
+    non_repeating = [combinations[0]]
+    for ref in combinations:
+        seen = False
+        for accepted in non_repeating:
+            rotated = accepted
+            for n in range(L):
+                rotated = cycle(rotated)
+                if rotated == ref:
+                    seen = True
+                    break
+            if seen:
+                break
+        if not seen:
+            non_repeating.append(ref)
+    return non_repeating
+
@@ -4,12 +4,31 @@
 # and using those patterns to draw customizable visualizations.
 import bases
 import line_shapes
+import registry
+import timing
+import uniques
 import numpy as np
-import matplotlib.pyplot as plt
+import io
+import html
+from functools import lru_cache
 import os
-from tqdm.auto import tqdm
+# matplotlib and tqdm take far longer to import than everything else here, so they are
+# imported by the functions that draw or report progress. Listing and looking up attributes
+# (e.g. `writer.py -ah`) and the native SVG output never load pyplot.
+
+def get_cmap():
+    """
+    Color map used for visual differentiation in visualizations (viridis).
+    """
+    import matplotlib
+    return(matplotlib.colormaps['viridis'])
+
+def __getattr__(name):
+    # writer.cmap is created on first use, with matplotlib
+    if name == "cmap":
+        return(get_cmap())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-cmap = plt.get_cmap('viridis')  # Color map used for visual differentiation in visualizations.
 #---------Functions for creating unique binary numbers------
 def cycle_list(l,loops = 1):
     """
@@ -24,31 +43,18 @@ def cycle_list(l,loops = 1):
 def generate_unique_combinations(L):
     """
     Generates unique, non-repeating binary combinations of length `L`.
-    The algorithm ensures cyclic equivalency is tested, filtering duplicates.
+    Each rotation class is represented by its first member in counting order, and the
+    classes are listed in that order. The patterns are streamed from
+    uniques.iter_unique_combinations, which finds them directly rather than by
+    comparing every candidate against every accepted pattern.
     Args:
         L (int): The length of binary patterns to generate.
     Returns:
         List[List[int]]: A list of unique binary combinations.
     """
-    combinations = generate_binary_strings(L)
-    non_repeating = [combinations[0]]  # A list to store only unique patterns.
-
-    for i in tqdm(range(len(combinations)),desc = "Generating Unique Binary Combinations"):
-        ref = list(combinations[i])
-        N = len(ref)
-        test = 0
-        for j in range(len(non_repeating)):
-            for n in range(N):
-
-                if cycle_list(list(non_repeating[j]),loops = n+1) == ref:  # Check cyclic equivalency.
-                    test += 1
-
-        if test == 0:
-            non_repeating.append(combinations[i])
-
-    for i in np.arange(len(non_repeating)):
-        non_repeating[i] = [int(s) for s in list(non_repeating[i])]
-    return(non_repeating)
+    from tqdm.auto import tqdm
+    return list(tqdm(uniques.iter_unique_combinations(L), total = uniques.unique_count(L),
+                     desc = "Generating Unique Binary Combinations"))
 
 def genbin(n, bs = ''):
     """
@@ -83,9 +89,67 @@ def generate_binary_strings(bit_count):
 
 #-------Functions for Visualizations and Drawing Runes---------
 
+def edge_segments(x,y,k = 1,shape_fn = line_shapes.straight,shape_kwargs = []):
+    """
+    Computes the curve of every edge i -> i+k (mod n) between the base points (x, y).
+    All edges are computed in one call when shape_fn has a batched form (shape_fn.batch,
+    see line_shapes), otherwise shape_fn is called edge by edge.
+    Returns:
+        Sequence of (points, 2) arrays, one per edge.
+    """
+    P = np.column_stack([x,y])
+    Q = np.roll(P,-k,axis = 0)
+    batch_fn = getattr(shape_fn,"batch",None)
+    if batch_fn is not None:
+        X,Y = batch_fn(P,Q,*shape_kwargs)
+        return(np.stack([X,Y],axis = -1))
+    return([np.column_stack(shape_fn(P[i],Q[i],*shape_kwargs)) for i in range(len(P))])
+
+#---------Memoised Glyph Geometry-------#
+# The base points and the curve of every possible edge depend only on the number of points,
+# the base/shape functions with their arguments and the step k, never on the spell, so they
+# are computed once per configuration and kept in bounded LRU caches (the base points in
+# the registry of bases.points). The cached arrays are read-only and shared by every render.
+GEOMETRY_CACHE_SIZE = 256
+
+def base_points(n,base_fn = bases.polygon,base_kwargs = []):
+    """
+    Memoised base_fn(n,*base_kwargs), returned as read-only arrays; base_fn may also be
+    the name of a base in bases.BASES.
+    """
+    return(bases.points(base_fn,n,*base_kwargs))
+
+def edge_template(n,k = 1,base_fn = bases.polygon,base_kwargs = [],
+                  shape_fn = line_shapes.straight,shape_kwargs = []):
+    """
+    Memoised edge_segments for the base points of base_fn: the curves of every edge
+    i -> i+k of an n point glyph, from which a render only picks the "on" and "off" edges.
+    Returns:
+        Sequence of (points, 2) read-only arrays, one per edge.
+    """
+    try:
+        return(_edge_template(n,k,base_fn,tuple(base_kwargs),shape_fn,tuple(shape_kwargs)))
+    except TypeError:  # unhashable arguments cannot be cached
+        x,y = base_points(n,base_fn,base_kwargs)
+        return(_read_only(edge_segments(x,y,k = k,shape_fn = shape_fn,shape_kwargs = shape_kwargs)))
+
+@lru_cache(maxsize = GEOMETRY_CACHE_SIZE)
+def _edge_template(n,k,base_fn,base_kwargs,shape_fn,shape_kwargs):
+    x,y = base_points(n,base_fn,base_kwargs)
+    return(_read_only(edge_segments(x,y,k = k,shape_fn = shape_fn,shape_kwargs = shape_kwargs)))
+
+def _read_only(arrays):
+    if isinstance(arrays,np.ndarray):
+        arrays.setflags(write = False)
+        return(arrays)
+    arrays = tuple(np.asarray(a) for a in arrays)
+    for a in arrays:
+        a.setflags(write = False)
+    return(arrays)
+
 def decode_shape(in_array, k=1, point_color='k', on_color='darkred', off_color="grey",
                  label=None, plot_base=True, base_fn=bases.polygon, base_kwargs=[],
-                 shape_fn=line_shapes.straight, shape_kwargs=[]):
+                 shape_fn=line_shapes.straight, shape_kwargs=[], ax=None):
     """
     Decodes and visualizes a single binary array as a graphical shape.
     Args:
@@ -94,45 +158,101 @@ def decode_shape(in_array, k=1, point_color='k', on_color='darkred', off_color="
         point_color (str): Color for the points of the base.
         on_color (str): Color for the active connections.
         off_color (str): Color for inactive connections.
+        ax (Axes): Axes to draw on (default: pyplot's current axes).
         Other arguments control plot behavior and aesthetic options.
     """
+    import matplotlib
+    from matplotlib.lines import Line2D
+    if ax is None:
+        import matplotlib.pyplot as plt
+        ax = plt.gca()
     n = len(in_array)  # Number of points in the binary array.
-    x,y = base_fn(n,*base_kwargs)  # Base shape generated using the base function.
-    n = len(in_array)
-    x,y = base_fn(n,*base_kwargs)
+    with timing.span("geometry"):
+        x,y = base_points(n,base_fn,base_kwargs)  # Base shape generated using the base function.
+        segments = edge_template(n,k = k,base_fn = base_fn,base_kwargs = base_kwargs,
+                                 shape_fn = shape_fn,shape_kwargs = shape_kwargs)
     if plot_base == True:
-        plt.scatter(x[1:],y[1:],s = 70,facecolors = 'none', edgecolors = point_color)
-        plt.scatter(x[0],y[0],s = 70,facecolors = point_color, edgecolors = point_color)
-        plt.axis('off')
-        plt.axis('scaled')  # Ensure the overall plot is displayed in proper proportions.
+        ax.scatter(x[1:],y[1:],s = 70,facecolors = 'none', edgecolors = point_color)
+        ax.scatter(x[0],y[0],s = 70,facecolors = point_color, edgecolors = point_color)
+        ax.axis('off')
+        ax.axis('scaled')  # Ensure the overall plot is displayed in proper proportions.
+    # Consecutive edges with the same style are drawn as one LineCollection, styled (and,
+    # for curves, simplified) as plt.plot draws a line. Splitting at style changes keeps the original drawing order,
+    # so crossings between "on" and "off" edges overlap exactly as they did edge by edge.
+    styles = {0: dict(colors = off_color,linestyles = "--",linewidths = 0.25,
+                      capstyle = matplotlib.rcParams["lines.dash_capstyle"],
+                      joinstyle = matplotlib.rcParams["lines.dash_joinstyle"]),
+              1: dict(colors = on_color,linestyles = "-",linewidths = 2,
+                      capstyle = matplotlib.rcParams["lines.solid_capstyle"],
+                      joinstyle = matplotlib.rcParams["lines.solid_joinstyle"])}
+    run,run_style = [],None
     for i,elem in enumerate(in_array):
-        P = [x[i],y[i]]
-        Q = [x[(i+k)%n],y[(i+k)%n]]
-        X,Y = shape_fn(P,Q,*shape_kwargs)
-        if elem == 0:  # Draw inactive connections.
-            plt.plot(X,Y,color = off_color,ls = "--",linewidth=0.25)
-        elif elem == 1:
-            plt.plot(X,Y,color = on_color,ls = "-",label = label if i == np.where(in_array == 1)[0][0] else None,
-                     linewidth = 2)
-        else:
+        if elem != 0 and elem != 1:
             print(f'elem {elem} at index {i} is not valid, input being skipped')
+            continue
+        if elem != run_style and len(run) > 0:
+            ax.add_collection(_line_collection(run,**styles[run_style]))
+            run = []
+        run_style = elem
+        run.append(segments[i])
+    if len(run) > 0:
+        ax.add_collection(_line_collection(run,**styles[run_style]))
+    ax.autoscale_view()
+    if label is not None and np.any(np.asarray(in_array) == 1):
+        # Legend entry of the active edges, drawn as the Line2D it has always been
+        ax.add_line(Line2D([],[],color = on_color,ls = "-",linewidth = 2,label = label))
 
     return  # Return nothing but renders visualization via matplotlib.
+
+def _line_collection(segments,**kwargs):
+    #a LineCollection that draws each segment exactly as a Line2D of it would be drawn
+    return(_simplified_line_collection()(segments,**kwargs))
+
+@lru_cache(maxsize = None)
+def _simplified_line_collection():
+    #Agg simplifies a Line2D's path (rcParams["path.simplify"], for paths of 128 or more
+    #points, such as arcs) in display space, but draws a LineCollection's paths as they are,
+    #which moves antialiased pixels of curved edges. This subclass simplifies each such path
+    #the same way when it is drawn, so edges match the plt.plot per edge they replace.
+    from matplotlib.collections import LineCollection
+    from matplotlib.path import Path
+    class SimplifiedLineCollection(LineCollection):
+        def draw(self,renderer):
+            paths = self._paths
+            if any(path.should_simplify for path in paths):
+                transform = self.get_transform()
+                inverse = transform.inverted()
+                simplified = []
+                for path in paths:
+                    if path.should_simplify:
+                        path = path.cleaned(transform = transform,remove_nans = True,simplify = True)
+                        path = Path(inverse.transform(path.vertices[:-1]),path.codes[:-1])  # without STOP
+                    simplified.append(path)
+                self._paths = simplified
+            try:
+                super().draw(renderer)
+            finally:
+                self._paths = paths
+    return(SimplifiedLineCollection)
+
 def draw_multiple_inputs(in_array,
                          base_fn = bases.polygon,base_kwargs = [],
                          shape_fn = line_shapes.straight,shape_kwargs = [],
                          point_color = 'k',labels = [],legend = False,colors = [],
-                         legend_loc = "upper left"):
+                         legend_loc = "upper left",ax = None):
     #Visualizes multiple binary input arrays on a single shared base for comparison.
-    #draws multiple inputs on a single base
+    #draws multiple inputs on a single base, on `ax` or else pyplot's current axes
+    if ax is None:
+        import matplotlib.pyplot as plt
+        ax = plt.gca()
     if isinstance(colors,list) and len(colors) == 0:
         colors = [point_color]*in_array.shape[0]
     elif isinstance(colors,str):
         colors = [colors]*in_array.shape[0]
     n = in_array.shape[1]
-    x,y = base_fn(n,*base_kwargs)
-    plt.scatter(x[1:],y[1:],s=70,facecolors='none',edgecolors=point_color)  # Root visualized.
-    plt.scatter(x[0],y[0],s = 70,facecolors = point_color, edgecolors = point_color)
+    x,y = base_points(n,base_fn,base_kwargs)
+    ax.scatter(x[1:],y[1:],s=70,facecolors='none',edgecolors=point_color)  # Root visualized.
+    ax.scatter(x[0],y[0],s = 70,facecolors = point_color, edgecolors = point_color)
 
     if len(labels) != in_array.shape[0]:
         labels = [None]*in_array.shape[0]
@@ -140,12 +260,12 @@ def draw_multiple_inputs(in_array,
     for i,k in enumerate(range(in_array.shape[0])):
 
         decode_shape(in_array[i],k = k+1,base_fn = base_fn,base_kwargs = base_kwargs,
-                     shape_fn = shape_fn,shape_kwargs = shape_kwargs,label = labels[i],on_color = colors[i])
+                     shape_fn = shape_fn,shape_kwargs = shape_kwargs,label = labels[i],on_color = colors[i],ax = ax)
 
     if labels[0] != None and legend == True:
-        plt.legend(loc = legend_loc,fontsize = 10)
-    plt.axis('off')
-    plt.axis('scaled')
+        ax.legend(loc = legend_loc,fontsize = 10)
+    ax.axis('off')
+    ax.axis('scaled')
 def load_attribute(fname):
     """
     Reads Attributes from a specified text file.
@@ -157,53 +277,295 @@ def load_attribute(fname):
     data = [d.replace("\n","").lower() for d in data]
     return(data)
 
+def load_patterns(N, indices, base_dir = "", build = False):
+    """
+    Returns rows `indices` of the table of unique binary patterns of length `N` as an array.
+    Rows are read from the memory-mapped table in Uniques/ when it has been built (or from
+    a Uniques/{N}.npy saved by earlier versions), otherwise each row is found directly with
+    uniques.unrank so the full table is never generated. Pass `build = True` to build and
+    cache the table on a miss instead.
+    """
+    with timing.span("uniques"):
+        table = uniques.open_table(N, base_dir + "Uniques/", build = build)
+        if table is not None:
+            return table.rows(indices)
+        if os.path.isfile(base_dir + f"Uniques/{N}.npy"):
+            non_repeating = np.load(base_dir + f"Uniques/{N}.npy", mmap_mode = "r")
+            return np.array([non_repeating[i] for i in indices])
+        return np.array([uniques.unrank(i, N) for i in indices])
+
+#---------Schema-driven Spell Encoding-------#
+# A glyph draws one layer per attribute: the unique pattern whose row in the Uniques table
+# is the index of the attribute's value in its file, over N = 2*layers+1 points. A schema
+# lists the layers as (field, attribute file, legend label); a SpellEncoder compiles the
+# lookup tables and the pattern rows of a schema once and then turns spells into the
+# (layers, N) bit arrays that draw_multiple_inputs and svg_glyph draw, or reads spells back
+# from those arrays.
+SPELL_SCHEMA = (("level","levels","level"),
+                ("school","school","school"),
+                ("dtype","damage_types","damage type"),
+                ("area","area_types","area_type"),
+                ("range","range","range"))
+SPELL_SCHEMA_2 = SPELL_SCHEMA + (("duration","duration","duration"),)  # draw_spell_2's layers
+
+class SpellEncoder():
+    def __init__(self,schema = SPELL_SCHEMA,base_dir = "",build = False):
+        """
+        Initialize an encoder for the attributes of `schema`.
+        Args:
+            schema (sequence): (field, attribute file, label) of each layer, innermost first,
+                e.g. ("dtype","damage_types","damage type") for Attributes/damage_types.txt.
+            base_dir (str): Directory containing the Attributes and Uniques folders.
+            build (bool): Build and cache the Uniques table for N if it is missing.
+        """
+        self.schema = tuple(tuple(layer) for layer in schema)
+        self.fields = [layer[0] for layer in self.schema]
+        self.N = 2*len(self.schema)+1
+        self.base_dir = base_dir
+        self.build = build
+        self._compiled = (None,None)  # (lookup dictionaries, pattern rows), replaced together
+        self._decoder = None  # index of the pattern rows for decoding, built on first use
+
+    def compile(self):
+        """
+        Returns the lookup dictionary of every layer and the pattern rows (as a read-only
+        (rows, N) array) that they index. They are built on first use, and again only when
+        an attribute file changes on disk.
+        """
+        attrs = registry.get_registry(self.base_dir)
+        lookups = [attrs.lookup(file) for _,file,_ in self.schema]
+        compiled,patterns = self._compiled
+        if compiled is None or any(a is not b for a,b in zip(lookups,compiled)):
+            rows = max(max(lookup.values(),default = 0) for lookup in lookups)+1
+            count = uniques.unique_count(self.N)
+            if rows > count:
+                raise ValueError(f"{rows} attribute values do not fit the {count} unique patterns of {self.N} bits")
+            patterns = _read_only(load_patterns(self.N,range(rows),base_dir = self.base_dir,build = self.build))
+            self._compiled = (lookups,patterns)
+        return(lookups,patterns)
+
+    def values(self,spell):
+        """
+        The attribute values of a spell in layer order, from a dict keyed by field or a
+        sequence already in layer order.
+        """
+        if isinstance(spell,dict):
+            return([spell.get(field) for field in self.fields])
+        values = list(spell)
+        if len(values) != len(self.schema):
+            raise ValueError(f"expected {len(self.schema)} attribute values, got {len(values)}")
+        return(values)
+
+    def indices(self,spell,blank_missing = False):
+        """
+        Index of each attribute value of a spell in its file.
+        Args:
+            spell (dict or sequence): The spell, as for `values`.
+            blank_missing (bool): Give missing values (None or "") index 0, the blank
+                pattern, instead of raising.
+        Returns:
+            List[int]: One index per layer.
+        Raises:
+            ValueError: If a value is not in its attribute file.
+        """
+        lookups,_ = self.compile()
+        out = []
+        for value,lookup,(_,file,_) in zip(self.values(spell),lookups,self.schema):
+            if blank_missing and (value is None or value == ""):
+                out.append(0)
+                continue
+            i = lookup.get(registry.normalise(value))
+            if i is None:
+                raise ValueError(f"{value!r} is not a valid option in {self._path(file)}")
+            out.append(i)
+        return(out)
+
+    def indices_many(self,spells,blank_missing = False):
+        """
+        Indices of a batch of spells, resolving each distinct value of a layer only once.
+        Args:
+            spells (iterable): Spells as for `values`.
+            blank_missing (bool): As for `indices`.
+        Returns:
+            np.ndarray: (spells, layers) array of indices.
+        """
+        lookups,_ = self.compile()
+        spells = list(spells)
+        if all(isinstance(spell,dict) for spell in spells):
+            columns = [[spell.get(field) for spell in spells] for field in self.fields]
+        else:
+            columns = list(zip(*(self.values(spell) for spell in spells))) or [()]*len(self.schema)
+        out = np.empty((len(spells),len(self.schema)),dtype = np.intp)
+        for j,(column,lookup,(_,file,_)) in enumerate(zip(columns,lookups,self.schema)):
+            distinct = {}  # value -> position in the order first seen
+            codes = np.fromiter((distinct.setdefault(v,len(distinct)) for v in column),
+                                dtype = np.intp,count = len(spells))
+            resolved = np.empty(len(distinct),dtype = np.intp)
+            for value,k in distinct.items():
+                if blank_missing and (value is None or value == ""):
+                    resolved[k] = 0
+                    continue
+                i = lookup.get(registry.normalise(value))
+                if i is None:
+                    raise ValueError(f"{value!r} is not a valid option in {self._path(file)}")
+                resolved[k] = i
+            out[:,j] = resolved[codes]
+        return(out)
+
+    def patterns(self,indices):
+        """
+        Pattern rows of attribute indices: a (layers, N) array for the indices of one spell,
+        or (spells, layers, N) for an array of them.
+        """
+        return(self.compile()[1][np.asarray(indices,dtype = np.intp)])
+
+    def encode(self,spell,blank_missing = False):
+        """
+        The (layers, N) bit array drawing a spell; arguments as for `indices`.
+        """
+        return(self.patterns(self.indices(spell,blank_missing = blank_missing)))
+
+    def encode_many(self,spells,blank_missing = False):
+        """
+        The (spells, layers, N) bit arrays of a batch of spells; arguments as for `indices_many`.
+        """
+        return(self.patterns(self.indices_many(spells,blank_missing = blank_missing)))
+
+    def labels(self,spell):
+        """
+        Legend labels ("label: value") of a spell, in layer order.
+        """
+        return([f"{label}: {value}" for value,(_,_,label) in zip(self.values(spell),self.schema)])
+
+    def decode_indices(self,glyphs):
+        """
+        Attribute indices read back from glyph patterns. Each layer's pattern may start at
+        any of its points: its canonical rotation is looked up in an index of the pattern
+        rows, so a glyph is decoded in O(layers) without scanning the Uniques table.
+        Args:
+            glyphs (array-like): The (layers, N) 0/1 patterns of a glyph, or a
+                (glyphs, layers, N) array of them.
+        Returns:
+            np.ndarray: Indices of shape (layers,) or (glyphs, layers); -1 marks a layer
+                whose pattern is not the pattern of any value of its attribute.
+        """
+        glyphs = np.asarray(glyphs)
+        if glyphs.ndim not in (2,3) or glyphs.shape[-2:] != (len(self.schema),self.N):
+            raise ValueError(f"expected glyphs of shape ({len(self.schema)}, {self.N}), got {glyphs.shape}")
+        index,keys,rows,counts = self._decoding()
+        if glyphs.ndim == 2:
+            out = np.array([index.get(uniques.canonical(uniques.to_int(layer),self.N),-1)
+                            for layer in glyphs],dtype = np.intp)
+        else:
+            canonical = uniques.canonical_array(glyphs)
+            at = np.minimum(np.searchsorted(keys,canonical),len(keys)-1)
+            out = np.where(keys[at] == canonical,rows[at],-1)
+        out[out >= counts] = -1  # a row past the end of this layer's attribute file
+        return(out)
+
+    def decode(self,glyph,strict = True):
+        """
+        The spell drawn by a glyph.
+        Args:
+            glyph (array-like): The (layers, N) 0/1 patterns of the glyph.
+            strict (bool): Raise if a layer matches no attribute value; otherwise that
+                field is None.
+        Returns:
+            dict: field -> attribute value, as written in its file.
+        Raises:
+            ValueError: If `strict` and a layer matches no attribute value.
+        """
+        glyph = np.asarray(glyph)
+        return(self._spells(glyph[np.newaxis],self.decode_indices(glyph)[np.newaxis],strict)[0])
+
+    def decode_many(self,glyphs,strict = True):
+        """
+        The spells drawn by a (glyphs, layers, N) array of glyphs; arguments as for `decode`.
+        Returns:
+            List[dict]: One spell per glyph.
+        """
+        glyphs = np.asarray(glyphs)
+        return(self._spells(glyphs,self.decode_indices(glyphs),strict))
+
+    def _spells(self,glyphs,indices,strict):
+        #the attribute values of decoded (glyphs, layers) indices
+        if strict and (indices < 0).any():
+            g,j = np.argwhere(indices < 0)[0]
+            pattern = "".join(str(int(bit != 0)) for bit in glyphs[g,j])
+            raise ValueError(f"layer {j} ({self.fields[j]}) of glyph {g}: pattern {pattern} "
+                             f"matches no value in {self._path(self.schema[j][1])}")
+        attrs = registry.get_registry(self.base_dir)
+        labels = [attrs.labels(file) for _,file,_ in self.schema]
+        return([{field: (labels[j][i] if i >= 0 else None) for j,(field,i) in enumerate(zip(self.fields,row))}
+                for row in indices.tolist()])
+
+    def _decoding(self):
+        #canonical rotation -> row index of the compiled patterns, as a dictionary for single
+        #glyphs and as sorted keys with their rows for batches, plus each layer's value count
+        _,patterns = self.compile()
+        state = self._decoder
+        if state is None or state[0] is not patterns:
+            keys = uniques.canonical_array(patterns)
+            order = np.argsort(keys,kind = "stable")
+            index = {}
+            for i,key in enumerate(keys.tolist()):
+                index.setdefault(key,i)
+            attrs = registry.get_registry(self.base_dir)
+            counts = np.array([len(attrs.values(file)) for _,file,_ in self.schema],dtype = np.intp)
+            state = (patterns,index,keys[order],order,counts)
+            self._decoder = state
+        return(state[1:])
+
+    def _path(self,file):
+        return(registry.get_registry(self.base_dir).path(file))
+
+_encoders = {}
+
+def get_encoder(schema = SPELL_SCHEMA,base_dir = ""):
+    """
+    Returns the SpellEncoder shared by every caller for `schema` and `base_dir`.
+    """
+    key = (tuple(tuple(layer) for layer in schema),base_dir)
+    encoder = _encoders.get(key)
+    if encoder is None:
+        encoder = _encoders.setdefault(key,SpellEncoder(schema,base_dir = base_dir))
+    return(encoder)
+
+def _encode_spell(encoder,spell,colors = [],breakdown = False,blank_missing = False):
+    #the layers, legend labels and line colours the drawing functions draw a spell with
+    with timing.span("attributes"):
+        indices = encoder.indices(spell,blank_missing = blank_missing)
+    if isinstance(colors,list) and len(colors) == 0 and breakdown == True:
+        cmap = get_cmap()
+        colors = [cmap(i/len(indices)) for i in range(len(indices))]
+    return(encoder.patterns(indices),encoder.labels(spell),colors)
 
 def draw_spell(level,rang,area,dtype,school,title = None,
                savename = "output.png",legend = False,
                 base_fn = bases.polygon,base_kwargs = [],
                 shape_fn = line_shapes.straight,shape_kwargs = [],
-                colors = [],legend_loc = "upper left",breakdown = False):
+                colors = [],legend_loc = "upper left",breakdown = False,ax = None):
 #Visualizes a spell based on user-defined values and input Attributes loaded via text files.
     #draws a spell given certain values by comparing it to input txt
-    ranges = load_attribute("Attributes/range.txt")
-    levels = load_attribute("Attributes/levels.txt")
-    area_types = load_attribute("Attributes/area_types.txt")
-    dtypes = load_attribute("Attributes/damage_types.txt")
-    schools = load_attribute("Attributes/school.txt")
-    i_range = ranges.index(rang)
-    i_levels = levels.index(str(level))
-    i_area = area_types.index(area)
-    i_dtype = dtypes.index(dtype)
-    i_school = schools.index(school)
-    attributes = [i_levels,i_school,i_dtype,i_area,i_range]
-    labels = [f"level: {level}",
-              f"school: {school}",
-              f"damage type: {dtype}",
-              f"range: {rang}",
-              f"area_type: {area}"]
-    N = 2*len(attributes)+1
-
-    if len(colors) == 0 and breakdown == True:
-        colors = [cmap(i/len(attributes)) for i in range(len(attributes))]
-    if not os.path.isdir("Uniques/"):  # Directory to save generated unique binary combinations.
-        os.makedirs("Uniques/")
-    if os.path.isfile(f'Uniques/{N}.npy'):
-        non_repeating = np.load(f'Uniques/{N}.npy')
-    else:
-        non_repeating = generate_unique_combinations(N)
-        non_repeating = np.array(non_repeating)
-        np.save(f"Uniques/{N}.npy",non_repeating)
-    input_array = np.array([non_repeating[i] for i in attributes])#note +1 s.t. 0th option is always open for empty input
-    #print(input_array)
-    draw_multiple_inputs(input_array,labels = labels,legend = legend,
-                         base_fn = base_fn,base_kwargs = base_kwargs,
-                         shape_fn = shape_fn,shape_kwargs = shape_kwargs,
-                         colors = colors,legend_loc = legend_loc)
+    pyplot = ax is None  # without an axes, draw on pyplot's current figure and save or show it
+    if pyplot:
+        import matplotlib.pyplot as plt
+        ax = plt.gca()
+    spell = dict(level = level,school = school,dtype = dtype,area = area,range = rang)
+    input_array,labels,colors = _encode_spell(get_encoder(SPELL_SCHEMA),spell,colors,breakdown)
+    with timing.span("draw"):
+        draw_multiple_inputs(input_array,labels = labels,legend = legend,
+                             base_fn = base_fn,base_kwargs = base_kwargs,
+                             shape_fn = shape_fn,shape_kwargs = shape_kwargs,
+                             colors = colors,legend_loc = legend_loc,ax = ax)
 
-    plt.title(title,fontsize = "80")
+    ax.set_title(title,fontsize = "80")
+    if not pyplot:
+        return(ax)
 
     if savename is not None:
-        plt.savefig(savename,transparent = False, bbox_inches='tight')
+        with timing.span("encode"):
+            plt.savefig(savename,transparent = False, bbox_inches='tight')
         plt.clf()
     else:
         plt.show()
@@ -213,57 +575,36 @@ def draw_spell_2(level,rang,area,dtype,school,duration,concentration,ritual,titl
                 base_fn = bases.polygon,base_kwargs = [],
                 shape_fn = line_shapes.straight,shape_kwargs = [],
                 colors = [],legend_loc = "upper left",breakdown = False,
-                base_dir = ""):
+                base_dir = "",ax = None):
 
     #draws a spell given certain values by comparing it to input txt
-    ranges = load_attribute(base_dir +"Attributes/range.txt")
-    levels = load_attribute(base_dir +"Attributes/levels.txt")
-    area_types = load_attribute(base_dir +"Attributes/area_types.txt")
-    dtypes = load_attribute(base_dir +"Attributes/damage_types.txt")
-    schools = load_attribute(base_dir +"Attributes/school.txt")
-    durations = load_attribute(base_dir +"Attributes/duration.txt")
-    i_range = ranges.index(rang)
-    i_levels = levels.index(str(level))
-    i_area = area_types.index(area)
-    i_dtype = dtypes.index(dtype)
-    i_school = schools.index(school)
-    i_duration = durations.index(duration)
-    attributes = [i_levels,i_school,i_dtype,i_area,i_range,i_duration]
-    labels = [f"level: {level}",
-              f"school: {school}",
-              f"damage type: {dtype}",
-              f"range: {rang}",
-              f"area_type: {area}",
-              f'duration: {duration}']
-    N = 2*len(attributes)+1
-
-    if len(colors) == 0 and breakdown == True:
-        colors = [cmap(i/len(attributes)) for i in range(len(attributes))]
-    if not os.path.isdir(base_dir +"Uniques/"):
-        os.makedirs(base_dir +"Uniques/")
-    if os.path.isfile(base_dir +f'Uniques/{N}.npy'):
-        non_repeating = np.load(base_dir +f'Uniques/{N}.npy')
-    else:
-        non_repeating = generate_unique_combinations(N)
-        non_repeating = np.array(non_repeating)
-        np.save(base_dir +f"Uniques/{N}.npy",non_repeating)
-    input_array = np.array([non_repeating[i] for i in attributes])#note +1 s.t. 0th option is always open for empty input
+    pyplot = ax is None  # without an axes, draw on pyplot's current figure and save or show it
+    if pyplot:
+        import matplotlib.pyplot as plt
+        ax = plt.gca()
+    spell = dict(level = level,school = school,dtype = dtype,area = area,range = rang,duration = duration)
+    input_array,labels,colors = _encode_spell(get_encoder(SPELL_SCHEMA_2,base_dir),spell,colors,breakdown)
 
-    draw_multiple_inputs(input_array,labels = labels,legend = legend,
-                         base_fn = base_fn,base_kwargs = base_kwargs,
-                         shape_fn = shape_fn,shape_kwargs = shape_kwargs,
-                         colors = colors,legend_loc = legend_loc)
+    with timing.span("draw"):
+        draw_multiple_inputs(input_array,labels = labels,legend = legend,
+                             base_fn = base_fn,base_kwargs = base_kwargs,
+                             shape_fn = shape_fn,shape_kwargs = shape_kwargs,
+                             colors = colors,legend_loc = legend_loc,ax = ax)
 
+    marker_color = colors if isinstance(colors,str) else 'k'  # a list of line colours is not a marker colour
     if concentration:
-        plt.plot(0,0,"",markersize = 10,marker = ".",color = colors)
+        ax.plot(0,0,"",markersize = 10,marker = ".",color = marker_color)
     if ritual:
 
-        plt.plot(0,0,"",markersize = 10,marker = ".",color= colors)
-        plt.plot(0,0,"",markersize = 20,marker = "o",color=colors,mfc='none',linewidth = 10)
+        ax.plot(0,0,"",markersize = 10,marker = ".",color= marker_color)
+        ax.plot(0,0,"",markersize = 20,marker = "o",color=marker_color,mfc='none',linewidth = 10)
 
-    plt.title(title)
+    ax.set_title(title)
+    if not pyplot:
+        return(ax)
     if savename is not None:
-        plt.savefig(savename,transparent = True, bbox_inches='tight')
+        with timing.span("encode"):
+            plt.savefig(savename,transparent = True, bbox_inches='tight')
         plt.clf()
     else:
         plt.show()
@@ -275,68 +616,741 @@ def draw_attribute(level = None,rang = None, area = None,
                     base_fn = bases.polygon,base_kwargs = [],
                 shape_fn = line_shapes.straight,shape_kwargs = [],
                 colors = [],legend_loc = "upper left",breakdown = False,
-                title = None):
-    ranges = load_attribute("Attributes/range.txt")
-    levels = load_attribute("Attributes/levels.txt")
-    area_types = load_attribute("Attributes/area_types.txt")
-    dtypes = load_attribute("Attributes/damage_types.txt")
-    schools = load_attribute("Attributes/school.txt")
-    durations = load_attribute("Attributes/duration.txt")
-
-    i_range,i_levels,i_school,i_dtype,i_area,i_duration = 0,0,0,0,0,0
-    if rang is not None:
-        i_range = ranges.index(rang)
-
-    elif level is not None:
-        i_levels = levels.index(str(level))
-
-    elif area is not None:
-        i_area = area_types.index(area)
-
-    elif dtype is not None:
-        i_dtype = dtypes.index(dtype)
-
-    elif school is not None:
-        i_school = schools.index(school)
-
-    elif duration is not None:
-        i_duration = durations.index(duration)
-    attributes = [i_levels,i_school,i_dtype,i_area,i_range,i_duration]
-    labels = [f"level: {level}",
-            f"school: {school}",
-            f"damage type: {dtype}",
-            f"range: {rang}",
-            f"area_type: {area}",
-            f"duration: {duration}"]
-
-    N = 2*len(attributes)+1
+                title = None,ax = None):
+    pyplot = ax is None  # without an axes, draw on pyplot's current figure and save or show it
+    if pyplot:
+        import matplotlib.pyplot as plt
+        ax = plt.gca()
+    #only the first attribute given (in the order below) is drawn, the other layers are left blank
+    spell = dict(level = None,school = None,dtype = None,area = None,range = None,duration = None)
+    for field,value in [("range",rang),("level",level),("area",area),
+                        ("dtype",dtype),("school",school),("duration",duration)]:
+        if value is not None:
+            spell[field] = value
+            break
+    input_array,labels,colors = _encode_spell(get_encoder(SPELL_SCHEMA_2),spell,colors,breakdown,
+                                              blank_missing = True)
+    with timing.span("draw"):
+        draw_multiple_inputs(input_array,labels = labels,legend = legend,
+                             base_fn = base_fn,base_kwargs = base_kwargs,
+                             shape_fn = shape_fn,shape_kwargs = shape_kwargs,
+                             colors = colors,legend_loc = legend_loc,ax = ax)
+    ax.set_title(title,fontsize = 30)
+    if not pyplot:
+        return(ax)
+    if savename is not None:
+        with timing.span("encode"):
+            plt.savefig(savename,dpi = 250,transparent = True, bbox_inches='tight')
+        plt.clf()
+    else:
+        plt.show()
 
-    if isinstance(colors,list) and len(colors) == 0 and breakdown == True:
-        colors = [cmap(i/len(attributes)) for i in range(len(attributes))]
-    if not os.path.isdir("Uniques/"):
-        os.makedirs("Uniques/")
-    if os.path.isfile(f'Uniques/{N}.npy'):
-        non_repeating = np.load(f'Uniques/{N}.npy')
+#---------Thread-safe Rendering without pyplot-------#
+# savefig options each drawing function uses when saving through pyplot
+_save_options = {draw_spell: dict(transparent = False),
+                 draw_spell_2: dict(transparent = True),
+                 draw_attribute: dict(dpi = 250,transparent = True)}
+
+def spell_figure(*args,draw_fn = None,figsize = None,**kwargs):
+    """
+    Draws a spell on a new Figure with its own Agg canvas instead of pyplot's global figure,
+    so several threads can draw at once and nothing is left in pyplot's figure registry.
+    Args:
+        draw_fn (function): draw_spell (default), draw_spell_2 or draw_attribute; all
+            other arguments are passed on to it.
+        figsize (tuple): Figure (width, height) in inches; defaults to rcParams.
+    Returns:
+        Figure: The drawn figure, freed once it is no longer referenced.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    if draw_fn is None:
+        draw_fn = draw_spell
+    fig = Figure(figsize = figsize)
+    FigureCanvasAgg(fig)
+    draw_fn(*args,ax = fig.add_subplot(),**kwargs)
+    return(fig)
+
+def render_spell(*args,draw_fn = None,fmt = "png",dpi = None,transparent = None,**kwargs):
+    """
+    Draws a spell like spell_figure and encodes it in memory, as savename would have saved it.
+    Args:
+        fmt (str): Image format (png, svg, pdf, ...).
+        dpi (float): Resolution; defaults to that of draw_fn's own output.
+        transparent (bool): Transparent background; defaults to draw_fn's own choice.
+        Other arguments are passed to spell_figure.
+    Returns:
+        bytes: The encoded image.
+    """
+    if draw_fn is None:
+        draw_fn = draw_spell
+    options = dict(_save_options[draw_fn])
+    if dpi is not None:
+        options["dpi"] = dpi
+    if transparent is not None:
+        options["transparent"] = transparent
+    with timing.span("render"):
+        fig = spell_figure(*args,draw_fn = draw_fn,**kwargs)
+        buf = io.BytesIO()
+        with timing.span("encode"):
+            fig.savefig(buf,format = fmt,bbox_inches = 'tight',**options)
+    return(buf.getvalue())
+
+#---------Native SVG Output-------#
+# A glyph is only points, straight lines and circular arcs, so it can be written as SVG
+# directly, without creating a figure. Connectors that describe their arcs (shape_fn.arc,
+# see line_shapes) become true SVG arcs instead of 150 point polylines; any other connector
+# is written as the polyline of its points. Lengths are in points, as in matplotlib, with
+# one unit of the base coordinates drawn SVG_SCALE points long.
+SVG_SCALE = 130
+
+def svg_glyph(in_array,base_fn = bases.polygon,base_kwargs = [],
+              shape_fn = line_shapes.straight,shape_kwargs = [],
+              point_color = 'k',labels = [],legend = False,colors = [],legend_loc = "upper left",
+              off_color = "grey",title = None,title_size = 12,concentration = False,ritual = False,
+              marker_color = 'k',background = None,size = None,scale = SVG_SCALE):
+    """
+    SVG counterpart of draw_multiple_inputs: draws the rows of in_array on a shared base.
+    Args:
+        in_array (array): Binary patterns, one row per layer; layer i connects points i+1 apart.
+        colors (str or list): Colour of each layer's active edges (default point_color).
+        labels (list[str]): Legend entry of each layer, shown when legend is True.
+        title (str): Title above the glyph, title_size points high.
+        concentration, ritual (bool): Draw draw_spell_2's markers at the origin.
+        background (str): Background colour (default transparent).
+        size (tuple): Displayed (width, height) in inches; defaults to the natural size.
+    Returns:
+        str: The SVG document.
+    """
+    in_array = np.atleast_2d(in_array)
+    n_layers,n = in_array.shape
+    if isinstance(colors,list) and len(colors) == 0:
+        colors = [point_color]*n_layers
+    elif isinstance(colors,str):
+        colors = [colors]*n_layers
+    if len(labels) != n_layers:
+        labels = [None]*n_layers
+    x,y = base_points(n,base_fn,base_kwargs)
+    x0,y0,x1,y1 = np.min(x),np.min(y),np.max(x),np.max(y)
+    layers = []
+    for i in range(n_layers):
+        paths,bounds = svg_edges(n,k = i+1,base_fn = base_fn,base_kwargs = base_kwargs,
+                                 shape_fn = shape_fn,shape_kwargs = shape_kwargs,scale = scale)
+        x0,y0,x1,y1 = min(x0,bounds[0]),min(y0,bounds[1]),max(x1,bounds[2]),max(y1,bounds[3])
+        layers.append(paths)
+
+    # Bounds in SVG coordinates (y points down), padded for line widths and markers
+    pad = 10
+    left,top = x0*scale - pad,-y1*scale - pad
+    width,height = (x1 - x0)*scale + 2*pad,(y1 - y0)*scale + 2*pad
+    view_top,view_height = top,height
+    if title is not None:  # room for the title above the glyph
+        view_top,view_height = top - 1.6*title_size,height + 1.6*title_size
+    body = []
+    if background is not None:
+        body.append(f'<rect x="{left:.2f}" y="{view_top:.2f}" width="{width:.2f}" height="{view_height:.2f}" '
+                    f'fill="{_svg_color(background)}"/>')
+    # Base points: the first filled, the others hollow, like the scatter of draw_multiple_inputs
+    point = _svg_color(point_color)
+    for j in range(n):
+        fill = point if j == 0 else "none"
+        body.append(f'<circle cx="{x[j]*scale:.2f}" cy="{-y[j]*scale:.2f}" r="4.18" '
+                    f'fill="{fill}" stroke="{point}" stroke-width="1.5"/>')
+    # Consecutive edges with the same style share one path, in drawing order, as in decode_shape
+    off = _svg_color(off_color)
+    entries = []
+    for i,paths in enumerate(layers):
+        on = _svg_color(colors[i])
+        styles = {0: f'stroke="{off}" stroke-width="0.25" stroke-dasharray="0.93,0.4"',
+                  1: f'stroke="{on}" stroke-width="2" stroke-linecap="square"'}
+        run,run_style = [],None
+        for j,elem in enumerate(in_array[i]):
+            if elem != 0 and elem != 1:
+                continue
+            if elem != run_style and len(run) > 0:
+                body.append(f'<path d="{"".join(run)}" {styles[run_style]}/>')
+                run = []
+            run_style = elem
+            run.append(paths[j])
+        if len(run) > 0:
+            body.append(f'<path d="{"".join(run)}" {styles[run_style]}/>')
+        if labels[i] is not None and np.any(in_array[i] == 1):
+            entries.append((on,labels[i]))
+    marker = _svg_color(marker_color)
+    if concentration or ritual:
+        body.append(f'<circle cx="0" cy="0" r="2.5" fill="{marker}"/>')
+    if ritual:
+        body.append(f'<circle cx="0" cy="0" r="10" fill="none" stroke="{marker}" stroke-width="1"/>')
+    if legend and len(entries) > 0:
+        # Framed legend in a corner of the glyph, with 10 point text like draw_multiple_inputs'
+        box_w = 38 + 6*max(len(label) for _,label in entries)
+        box_h = 8 + 14*len(entries)
+        bx = left + pad if "right" not in legend_loc else left + width - pad - box_w
+        by = top + pad if "lower" not in legend_loc else top + height - pad - box_h
+        body.append(f'<g font-family="sans-serif" font-size="10"><rect x="{bx:.2f}" y="{by:.2f}" '
+                    f'width="{box_w}" height="{box_h}" rx="2" fill="white" fill-opacity="0.8" '
+                    f'stroke="#cccccc" stroke-width="0.8"/>')
+        for j,(color,label) in enumerate(entries):
+            ly = by + 11 + 14*j
+            body.append(f'<path d="M{bx+6:.2f},{ly:.2f}h20" stroke="{color}" stroke-width="2" '
+                        f'stroke-linecap="square"/><text x="{bx+32:.2f}" y="{ly+3.5:.2f}">'
+                        f'{html.escape(str(label))}</text>')
+        body.append('</g>')
+    if title is not None:
+        body.append(f'<text x="{left + width/2:.2f}" y="{view_top + 1.2*title_size:.2f}" text-anchor="middle" '
+                    f'font-family="sans-serif" font-size="{title_size}">{html.escape(str(title))}</text>')
+
+    if size is None:
+        size = f'width="{width:.2f}pt" height="{view_height:.2f}pt"'
     else:
-        non_repeating = generate_unique_combinations(N)
-        non_repeating = np.array(non_repeating)
-        np.save(f"Uniques/{N}.npy",non_repeating)
-
-    input_array = []
-    for j,i in enumerate(attributes):
-        input_array.append(non_repeating[i])
-    input_array = np.array(input_array)#note +1 s.t. 0th option is always open for empty input
-    #print(input_array)
-    draw_multiple_inputs(input_array,labels = labels,legend = legend,
+        size = f'width="{size[0]}in" height="{size[1]}in"'
+    return(f'<svg xmlns="http://www.w3.org/2000/svg" {size} '
+           f'viewBox="{left:.2f} {view_top:.2f} {width:.2f} {view_height:.2f}" fill="none" '
+           f'stroke-linejoin="round">' + "".join(body) + '</svg>')
+
+def svg_edges(n,k = 1,base_fn = bases.polygon,base_kwargs = [],
+              shape_fn = line_shapes.straight,shape_kwargs = [],scale = SVG_SCALE):
+    """
+    Memoised SVG path data of every edge i -> i+k of an n point glyph, like edge_template.
+    Returns:
+        tuple: The path data of each edge, and the (x0, y0, x1, y1) bounds of all edges.
+    """
+    try:
+        return(_svg_edges(n,k,base_fn,tuple(base_kwargs),shape_fn,tuple(shape_kwargs),scale))
+    except TypeError:  # unhashable arguments cannot be cached
+        return(_svg_edges.__wrapped__(n,k,base_fn,base_kwargs,shape_fn,shape_kwargs,scale))
+
+@lru_cache(maxsize = GEOMETRY_CACHE_SIZE)
+def _svg_edges(n,k,base_fn,base_kwargs,shape_fn,shape_kwargs,scale):
+    segments = edge_template(n,k = k,base_fn = base_fn,base_kwargs = base_kwargs,
+                             shape_fn = shape_fn,shape_kwargs = shape_kwargs)
+    points = np.concatenate([np.asarray(s) for s in segments])
+    points = points[np.all(np.isfinite(points),axis = 1)]
+    bounds = tuple(points.min(axis = 0)) + tuple(points.max(axis = 0)) if len(points) else (0,0,0,0)
+    arc_fn = getattr(shape_fn,"arc",None)
+    if arc_fn is None:
+        return(tuple(_svg_polyline(s,scale) for s in segments),bounds)
+    x,y = base_points(n,base_fn,base_kwargs)
+    P = np.column_stack([x,y])
+    arcs = arc_fn(P,np.roll(P,-k,axis = 0),*shape_kwargs)
+    return(tuple(_svg_arc(*arc,scale) for arc in zip(*arcs)),bounds)
+
+def _svg_arc(a,b,r,theta0,theta1,scale):
+    # Path data of the arc of the circle (a, b, r) from angle theta0 to theta1
+    if not np.all(np.isfinite([a,b,r,theta0,theta1])):
+        return("")
+    sweep = 0 if theta1 > theta0 else 1  # counter-clockwise, with y flipped
+    # Arcs of half a turn or more are split, as the circle through the ends of a half turn
+    # is badly determined once they are rounded (and a full turn has no ends to go through)
+    pieces = int(np.ceil(abs(theta1 - theta0)/(0.75*np.pi))) or 1
+    R = r*scale
+    d = f"M{(a + r*np.cos(theta0))*scale:.2f},{-(b + r*np.sin(theta0))*scale:.2f}"
+    for t in np.linspace(theta0,theta1,pieces + 1)[1:]:
+        d += f"A{R:.2f},{R:.2f} 0 0 {sweep} {(a + r*np.cos(t))*scale:.2f},{-(b + r*np.sin(t))*scale:.2f}"
+    return(d)
+
+def _svg_polyline(segment,scale):
+    # Path data through the points of segment, broken where a point is not finite
+    d,move = [],True
+    for px,py in np.asarray(segment,dtype = float):
+        if not (np.isfinite(px) and np.isfinite(py)):
+            move = True
+            continue
+        d.append(f"{'M' if move else 'L'}{px*scale:.2f},{-py*scale:.2f}")
+        move = False
+    return("".join(d))
+
+# matplotlib's one letter colours; its other colour names are CSS names SVG understands
+_BASE_COLORS = {"b": "#0000ff","g": "#008000","r": "#ff0000","c": "#00bfbf",
+                "m": "#bf00bf","y": "#bfbf00","k": "#000000","w": "#ffffff"}
+
+# The CSS colour names, which matplotlib also accepts (matplotlib.colors.CSS4_COLORS)
+_CSS_COLORS = frozenset((
+    "aliceblue", "antiquewhite", "aqua", "aquamarine", "azure", "beige", "bisque", "black",
+    "blanchedalmond", "blue", "blueviolet", "brown", "burlywood", "cadetblue", "chartreuse",
+    "chocolate", "coral", "cornflowerblue", "cornsilk", "crimson", "cyan", "darkblue",
+    "darkcyan", "darkgoldenrod", "darkgray", "darkgreen", "darkgrey", "darkkhaki",
+    "darkmagenta", "darkolivegreen", "darkorange", "darkorchid", "darkred", "darksalmon",
+    "darkseagreen", "darkslateblue", "darkslategray", "darkslategrey", "darkturquoise",
+    "darkviolet", "deeppink", "deepskyblue", "dimgray", "dimgrey", "dodgerblue",
+    "firebrick", "floralwhite", "forestgreen", "fuchsia", "gainsboro", "ghostwhite", "gold",
+    "goldenrod", "gray", "green", "greenyellow", "grey", "honeydew", "hotpink", "indianred",
+    "indigo", "ivory", "khaki", "lavender", "lavenderblush", "lawngreen", "lemonchiffon",
+    "lightblue", "lightcoral", "lightcyan", "lightgoldenrodyellow", "lightgray",
+    "lightgreen", "lightgrey", "lightpink", "lightsalmon", "lightseagreen", "lightskyblue",
+    "lightslategray", "lightslategrey", "lightsteelblue", "lightyellow", "lime",
+    "limegreen", "linen", "magenta", "maroon", "mediumaquamarine", "mediumblue",
+    "mediumorchid", "mediumpurple", "mediumseagreen", "mediumslateblue",
+    "mediumspringgreen", "mediumturquoise", "mediumvioletred", "midnightblue", "mintcream",
+    "mistyrose", "moccasin", "navajowhite", "navy", "oldlace", "olive", "olivedrab",
+    "orange", "orangered", "orchid", "palegoldenrod", "palegreen", "paleturquoise",
+    "palevioletred", "papayawhip", "peachpuff", "peru", "pink", "plum", "powderblue",
+    "purple", "rebeccapurple", "red", "rosybrown", "royalblue", "saddlebrown", "salmon",
+    "sandybrown", "seagreen", "seashell", "sienna", "silver", "skyblue", "slateblue",
+    "slategray", "slategrey", "snow", "springgreen", "steelblue", "tan", "teal", "thistle",
+    "tomato", "turquoise", "violet", "wheat", "white", "whitesmoke", "yellow", "yellowgreen"))
+
+def _svg_color(color):
+    # CSS colour of a matplotlib colour, accepting and rejecting the same colours matplotlib
+    # does; matplotlib is only imported for its own notations ("C0", "tab:blue", "xkcd:...",
+    # grey levels as strings, ...) and to raise its error for invalid colours
+    if isinstance(color,str):
+        if color in _BASE_COLORS:
+            return(_BASE_COLORS[color])
+        if color.lower() in _CSS_COLORS:
+            return(color.lower())
+        if color.startswith("#") and len(color) in (4,7) and all(c in "0123456789abcdefABCDEF" for c in color[1:]):
+            return(color)
+    elif len(color) in (3,4) and all(isinstance(v,(int,float)) and 0 <= v <= 1 for v in color):
+        alpha = len(color) == 4 and color[3] < 1
+        return("#" + "".join(format(round(float(v)*255),"02x") for v in color[:4 if alpha else 3]))
+    from matplotlib.colors import to_hex,to_rgba
+    return(to_hex(color,keep_alpha = to_rgba(color)[3] < 1))
+
+def spell_svg(level,rang,area,dtype,school,duration = None,concentration = False,ritual = False,
+              title = None,legend = False,base_fn = bases.polygon,base_kwargs = [],
+              shape_fn = line_shapes.straight,shape_kwargs = [],colors = [],breakdown = False,
+              legend_loc = "upper left",base_dir = "",**kwargs):
+    """
+    Writes a spell as SVG with svg_glyph, without matplotlib figures: the spell of draw_spell,
+    or of draw_spell_2 when a duration is given (with its concentration and ritual markers).
+    Other arguments (background, size, scale, ...) are passed to svg_glyph.
+    Returns:
+        str: The SVG document.
+    """
+    spell = dict(level = level,school = school,dtype = dtype,area = area,range = rang)
+    schema = SPELL_SCHEMA
+    if duration is not None:
+        spell["duration"] = duration
+        schema = SPELL_SCHEMA_2
+    input_array,labels,colors = _encode_spell(get_encoder(schema,base_dir),spell,colors,breakdown)
+    marker_color = colors if isinstance(colors,str) else 'k'
+    with timing.span("svg"):
+        return(svg_glyph(input_array,
                          base_fn = base_fn,base_kwargs = base_kwargs,
                          shape_fn = shape_fn,shape_kwargs = shape_kwargs,
-                         colors = colors,legend_loc = legend_loc)
-    plt.title(title,fontsize = 30)
-    if savename is not None:
-        plt.savefig(savename,dpi = 250,transparent = True, bbox_inches='tight')
+                         labels = labels,legend = legend,colors = colors,legend_loc = legend_loc,
+                         title = title,concentration = concentration,ritual = ritual,
+                         marker_color = marker_color,**kwargs))
+
+#---------Composited Rendering from Cached Rasters-------#
+# In every glyph of a configuration the points sit in the same place, and a layer only ever
+# draws one of a few patterns in one of a few colours. So the points are rasterised once per
+# configuration, and each (layer, pattern, colour) once as an overlay: the layer's "on" and
+# dashed "off" edges drawn by decode_shape, in its order, onto a transparent canvas and kept
+# as the premultiplied colour of just the pixels it covers. A spell is then alpha-composited
+# from those cached NumPy buffers, in matplotlib's draw order (points, then each layer's
+# edges, then the markers), without drawing anything. Only the pixels some overlay covers
+# are composited; every other pixel is the points raster as Agg drew it.
+RASTER_CACHE_SIZE = 512
+_PIXEL = np.dtype((np.void,16))  # the four float32 channels of a pixel
+
+def composite_glyph(in_array,base_fn = bases.polygon,base_kwargs = [],
+                    shape_fn = line_shapes.straight,shape_kwargs = [],
+                    point_color = 'k',off_color = "grey",colors = [],
+                    concentration = False,ritual = False,marker_color = 'k',
+                    size = 4,dpi = 100,background = None):
+    """
+    Composites a glyph like draw_multiple_inputs draws it (plus the concentration and ritual
+    markers of draw_spell_2) from cached rasters.
+    Args:
+        in_array (np.ndarray): (layers, N) patterns; layer i joins points i+1 apart.
+        colors (str or list): Colour of every layer's "on" edges, or one per layer
+            (default: point_color).
+        size (float): Width and height of the image in inches.
+        dpi (float): Resolution; the image is size*dpi pixels square.
+        background: Colour to flatten the image onto; None keeps it transparent.
+        Other arguments are as for draw_multiple_inputs and draw_spell_2.
+    Returns:
+        np.ndarray: (pixels, pixels, 4) uint8 RGBA image.
+    """
+    from matplotlib.colors import to_rgba
+    in_array = np.asarray(in_array)
+    if isinstance(colors,str):
+        colors = [colors]*in_array.shape[0]
+    elif len(colors) == 0:
+        colors = [point_color]*in_array.shape[0]
+    config = (in_array.shape[1],in_array.shape[0],base_fn,tuple(base_kwargs),shape_fn,tuple(shape_kwargs),size,dpi)
+    background = None if background is None else to_rgba(background)
+    with timing.span("raster"):
+        image,base = _cached(_points_raster,config,to_rgba(point_color),background)
+        overlays = [_cached(_layer_overlay,config,k+1,tuple(int(b) for b in pattern),to_rgba(color),to_rgba(off_color))
+                    for k,(pattern,color) in enumerate(zip(in_array,colors))]
+        if concentration or ritual:
+            overlays.append(_cached(_marker_overlay,config,"ritual" if ritual else "concentration",to_rgba(marker_color)))
+    with timing.span("composite"):
+        out = base.copy()  # premultiplied (r, g, b, alpha) of every pixel
+        pixel = out.view(_PIXEL).ravel()  # whole pixels, gathered and scattered in one step
+        covered = np.zeros(len(out),dtype = bool)
+        for index,colour,keep in overlays:  # "over": each overlay on top of what is drawn
+            drawn = pixel[index].view(np.float32).reshape(-1,4)
+            drawn *= keep
+            drawn += colour
+            pixel[index] = drawn.view(_PIXEL).ravel()
+            covered[index] = True
+        covered = np.flatnonzero(covered)
+        drawn = pixel[covered].view(np.float32).reshape(-1,4)
+        alpha = drawn[:,3:]*np.float32(1/255)  # never 0: an overlay has drawn on each of them
+        drawn[:,:3] /= alpha  # unpremultiplied, as Agg stores it
+        drawn[:,3:] *= 255
+        np.rint(drawn,out = drawn)
+        image = image.copy()
+        image.view(np.uint32).ravel()[covered] = drawn.astype(np.uint8).view(np.uint32).ravel()
+        return(image)
+
+def composite_spell(level,rang,area,dtype,school,duration = None,concentration = False,ritual = False,
+                    colors = [],breakdown = False,base_dir = "",**kwargs):
+    """
+    Encodes a spell as a PNG composited with composite_glyph: the glyph of draw_spell, or of
+    draw_spell_2 when a duration is given. There is no title or legend. Other arguments
+    (base_fn, size, dpi, background, ...) are passed to composite_glyph.
+    Returns:
+        bytes: The PNG image.
+    """
+    import zlib
+    from png_stream import PNGWriter
+    spell = dict(level = level,school = school,dtype = dtype,area = area,range = rang)
+    schema = SPELL_SCHEMA
+    if duration is not None:
+        spell["duration"] = duration
+        schema = SPELL_SCHEMA_2
+    input_array,_,colors = _encode_spell(get_encoder(schema,base_dir),spell,colors,breakdown)
+    marker_color = colors if isinstance(colors,str) else 'k'
+    image = composite_glyph(input_array,colors = colors,concentration = concentration,ritual = ritual,
+                            marker_color = marker_color,**kwargs)
+    buf = io.BytesIO()
+    with timing.span("encode"):
+        with PNGWriter(buf,image.shape[1],image.shape[0],channels = 4,level = 1,strategy = zlib.Z_RLE) as png:
+            png.write(image)
+    return(buf.getvalue())
+
+def _cached(fn,config,*args):
+    #fn's raster from the LRU cache, or drawn afresh when an argument cannot be hashed
+    try:
+        return(_raster_cache(fn,config,*args))
+    except TypeError:
+        return(fn(config,*args))
+
+@lru_cache(maxsize = RASTER_CACHE_SIZE)
+def _raster_cache(fn,config,*args):
+    return(_read_only(fn(config,*args)))
+
+def _raster_axes(config):
+    #a transparent figure whose axes fill it, with the same limits for every raster of config
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    n,layers,base_fn,base_kwargs,shape_fn,shape_kwargs,size,dpi = config
+    x,y = base_points(n,base_fn,base_kwargs)
+    points = [np.column_stack([x,y]),np.zeros((1,2))]  # the markers sit at (0, 0)
+    points += [np.asarray(s).reshape(-1,2) for k in range(1,layers+1)
+               for s in edge_template(n,k,base_fn,base_kwargs,shape_fn,shape_kwargs)]
+    points = np.concatenate(points)
+    low,high = points.min(axis = 0),points.max(axis = 0)
+    centre,half = (low+high)/2,(high-low).max()/2*1.08+1e-9  # room for the point markers
+    fig = Figure(figsize = (size,size),dpi = dpi)
+    fig.patch.set_alpha(0)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0,0,1,1])
+    ax.axis('off')
+    ax.set_xlim(centre[0]-half,centre[0]+half)
+    ax.set_ylim(centre[1]-half,centre[1]+half)
+    return(fig,ax)
+
+def _rasterise(fig):
+    fig.canvas.draw()
+    return(np.array(fig.canvas.buffer_rgba()))
+
+def _premultiplied(rgba):
+    #flat (pixels, 4) float32 premultiplied colours of an RGBA image from Agg
+    rgba = rgba.reshape(-1,4)*np.float32(1/255)
+    rgba[:,:3] *= rgba[:,3:]
+    return(rgba)
+
+def _overlay(fig):
+    #(pixels covered, their premultiplied colours, 1 - their alpha) of what is drawn on a
+    #transparent figure
+    rgba = _premultiplied(_rasterise(fig))
+    index = np.flatnonzero(rgba[:,3])
+    return(index,rgba[index],1-rgba[index,3:])
+
+def _points_raster(config,point_color,background):
+    #the points, drawn once and again with every layer as draw_multiple_inputs draws them:
+    #as the RGBA image from Agg and as premultiplied colours
+    n,layers,base_fn,base_kwargs,shape_fn,shape_kwargs,size,dpi = config
+    fig,ax = _raster_axes(config)
+    if background is not None:
+        fig.patch.set_facecolor(background)
+    x,y = base_points(n,base_fn,base_kwargs)
+    for _ in range(layers+1):
+        ax.scatter(x[1:],y[1:],s = 70,facecolors = 'none',edgecolors = point_color)
+        ax.scatter(x[0],y[0],s = 70,facecolors = point_color,edgecolors = point_color)
+    image = _rasterise(fig)
+    return(image,_premultiplied(image))
+
+def _layer_overlay(config,k,pattern,color,off_color):
+    #the "on" and dashed "off" edges of a pattern joining points k apart, drawn by decode_shape
+    n,layers,base_fn,base_kwargs,shape_fn,shape_kwargs,size,dpi = config
+    fig,ax = _raster_axes(config)
+    decode_shape(np.array(pattern),k = k,on_color = color,off_color = off_color,plot_base = False,
+                 base_fn = base_fn,base_kwargs = list(base_kwargs),
+                 shape_fn = shape_fn,shape_kwargs = list(shape_kwargs),ax = ax)
+    return(_overlay(fig))
+
+def _marker_overlay(config,kind,color):
+    #draw_spell_2's concentration dot, or its ritual dot and ring
+    fig,ax = _raster_axes(config)
+    ax.plot(0,0,"",markersize = 10,marker = ".",color = color)
+    if kind == "ritual":
+        ax.plot(0,0,"",markersize = 20,marker = "o",color = color,mfc = 'none',linewidth = 10)
+    return(_overlay(fig))
+
+#---------Batch Rendering of Spellbooks-------#
+SPELL_FIELDS = ["level","range","area","dtype","school","duration","concentration","ritual","title"]
+
+def read_spellbook(fname):
+    """
+    Reads a list of spells from a CSV file (with a header row) or a JSONL file (one JSON
+    object per line), chosen by the file extension.
+    Each spell has the keys in SPELL_FIELDS; concentration and ritual may be given as
+    true/false, yes/no or 1/0, and duration and title may be left out.
+    Returns:
+        List[dict]: The spells, in file order.
+    """
+    import csv
+    import json
+    with open(fname,"r",newline = "") as f:
+        if fname.lower().endswith((".jsonl",".json")):
+            spells = [json.loads(line) for line in f if line.strip()]
+        else:
+            spells = list(csv.DictReader(f))
+    return(spells)
+
+def _as_bool(value):
+    if isinstance(value,str):
+        value = value.strip().lower()
+        if value in ("","0","false","no","n","f"):
+            return False
+        if value in ("1","true","yes","y","t"):
+            return True
+        raise ValueError(f"{value!r} is not a valid true/false value")
+    return bool(value)
+
+def _spell_savename(i,spell,out_dir,fmt):
+    #file name from the row number and title, keeping only characters safe in file names
+    title = str(spell.get("title") or "spell")
+    slug = "".join(c if c.isalnum() else "_" for c in title.lower()).strip("_")
+    return os.path.join(out_dir,f"{i:05d}_{slug or 'spell'}.{fmt}")
+
+_batch_options = {}
+
+def _init_batch_worker(options,headless = True):
+    #runs once in each worker: keeps the render options and warms the shared state
+    #(Uniques table and draw_spell_2's compiled encoder) so every spell after the first is cheap
+    import matplotlib.pyplot as plt
+    if headless:
+        plt.switch_backend("Agg")
+    _batch_options.clear()
+    _batch_options.update(options)
+    encoder = get_encoder(SPELL_SCHEMA_2,options.get("base_dir",""))
+    uniques.open_table(encoder.N,encoder.base_dir + "Uniques/",build = True)
+    encoder.compile()
+
+def _spell_args(spell):
+    #draw_spell_2's positional arguments for a spellbook row; a missing duration is instantaneous
+    duration = spell.get("duration")
+    return((spell["level"],spell["range"],spell["area"],spell["dtype"],spell["school"],
+            duration if duration not in (None,"") else "instantaneous",
+            _as_bool(spell.get("concentration","")),_as_bool(spell.get("ritual",""))))
+
+def _render_batch_spell(job):
+    i,spell,savename = job
+    try:
+        draw_spell_2(*_spell_args(spell),title = spell.get("title") or None,savename = savename,**_batch_options)
+        return(i,savename,None)
+    except Exception as e:
+        import matplotlib.pyplot as plt
         plt.clf()
+        return(i,None,f"{type(e).__name__}: {e}")
+
+def render_spellbook(spells,out_dir = "spellbook",processes = None,fmt = "png",
+                     report = "errors.csv",chunksize = 4,progress = True,**kwargs):
+    """
+    Renders many spells with draw_spell_2 across a pool of worker processes.
+    Each worker keeps its pyplot figure, attribute registry and memory-mapped Uniques
+    table between spells. A spell that fails to render is recorded in the error report
+    rather than stopping the batch.
+    Args:
+        spells (list[dict] or str): Spells with the keys in SPELL_FIELDS, or the path of a
+            CSV/JSONL file to read them from.
+        out_dir (str): Directory the images are written to.
+        processes (int): Number of worker processes (default: one per CPU; 1 renders in
+            this process).
+        fmt (str): Image format/extension passed to savefig.
+        report (str): File name, inside out_dir, of the CSV error report (row, title, error).
+        Other keyword arguments are passed to draw_spell_2.
+    Returns:
+        Tuple[List[str], List[tuple]]: Files written, and (row, title, error) for each failure.
+    """
+    import csv
+    from tqdm.auto import tqdm
+    if isinstance(spells,str):
+        spells = read_spellbook(spells)
+    os.makedirs(out_dir,exist_ok = True)
+    jobs = [(i,spell,_spell_savename(i,spell,out_dir,fmt)) for i,spell in enumerate(spells)]
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1,min(processes,len(jobs)))
+
+    written,errors = [],[]
+    def collect(results):
+        for i,savename,error in tqdm(results,total = len(jobs),desc = "Rendering Spells",disable = not progress):
+            if error is None:
+                written.append(savename)
+            else:
+                errors.append((i,jobs[i][1].get("title",""),error))
+
+    if processes == 1:
+        _init_batch_worker(kwargs,headless = False)
+        collect(map(_render_batch_spell,jobs))
     else:
-        plt.show()
+        import multiprocessing
+        with multiprocessing.Pool(processes,initializer = _init_batch_worker,initargs = (kwargs,)) as pool:
+            collect(pool.imap_unordered(_render_batch_spell,jobs,chunksize = chunksize))
+
+    errors.sort()
+    if report is not None:
+        with open(os.path.join(out_dir,report),"w",newline = "") as f:
+            w = csv.writer(f)
+            w.writerow(["row","title","error"])
+            w.writerows(errors)
+    return(sorted(written),errors)
+
+#---------Spellbook Atlas-------#
+# Lays a whole spellbook out as one image, a grid of titled glyphs. The grid is drawn one row
+# (strip) at a time on a single reused figure and each strip is appended to a streamed PNG
+# (png_stream) as soon as it is drawn, so memory holds one strip however long the spellbook.
+# Tiles that share a configuration reuse the memoised geometry of base_points/edge_template.
+def render_atlas(spells,savename = "atlas.png",columns = 8,tile_size = 2.5,dpi = 100,
+                 title_size = 10,progress = True,**kwargs):
+    """
+    Draws every spell of a spellbook, as draw_spell_2 does, on a grid in one PNG image.
+    Args:
+        spells (list[dict] or str): Spells with the keys in SPELL_FIELDS, or the path of a
+            CSV/JSONL file to read them from.
+        savename (str or file): PNG file (or binary file object) to write.
+        columns (int): Glyphs per row.
+        tile_size (float): Width and height of each glyph's tile in inches.
+        dpi (float): Resolution; a tile is tile_size*dpi pixels square.
+        title_size (float): Font size of the titles.
+        progress (bool): Show a progress bar of the strips drawn.
+        Other keyword arguments are passed to draw_spell_2.
+    Returns:
+        Tuple[str, List[tuple]]: savename, and (row, title, error) for each spell that could
+        not be drawn (its tile is left empty).
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from tqdm.auto import tqdm
+    from png_stream import PNGWriter
+    if isinstance(spells,str):
+        spells = read_spellbook(spells)
+    if len(spells) == 0:
+        raise ValueError("the spellbook has no spells")
+    tile = int(round(tile_size*dpi))
+    rows = -(-len(spells)//columns)
+    width = columns*tile
+    fig = Figure(figsize = (width/dpi,tile/dpi),dpi = dpi,facecolor = "white")
+    canvas = FigureCanvasAgg(fig)
+    margin = 0.08  # of a tile, around the glyph; the title sits in the top margin
+    errors = []
+    with PNGWriter(savename,width,rows*tile) as png:
+        for r in tqdm(range(rows),desc = "Drawing Atlas",disable = not progress):
+            fig.clear()
+            for c,i in enumerate(range(r*columns,min((r+1)*columns,len(spells)))):
+                spell = spells[i]
+                ax = fig.add_axes([(c+margin)/columns,margin/2,(1-2*margin)/columns,1-2*margin])
+                try:
+                    draw_spell_2(*_spell_args(spell),title = spell.get("title") or None,ax = ax,**kwargs)
+                    ax.title.set_fontsize(title_size)
+                except Exception as e:
+                    ax.remove()
+                    errors.append((i,spell.get("title",""),f"{type(e).__name__}: {e}"))
+            with timing.span("encode"):
+                canvas.draw()
+                strip = np.asarray(canvas.buffer_rgba())[:tile,:width,:3]
+                png.write(strip)
+    return(savename,errors)
+
+#---------Precomputing Uniques Tables-------#
+# Builds the Uniques tables for a range of N ahead of time (e.g. when a deployment is built),
+# so no caller has to wait for one on a cache miss. Each table is split into slices of
+# consecutive rows, i.e. of consecutive bit patterns, that worker processes generate
+# independently from their first pattern (uniques.unrank). Each finished slice is saved to
+# Uniques/.{N}.parts/, so an interrupted run picks up where it stopped; when every slice is
+# done they are joined in table order into Uniques/{N}.uniq and the slices are deleted.
+def precompute_uniques(lengths,base_dir = "",processes = None,chunk_rows = 2**18,progress = True):
+    """
+    Builds and caches the Uniques tables of every length in `lengths` in parallel.
+    Tables that are already cached are skipped, and slices saved by an earlier,
+    interrupted run are reused.
+    Args:
+        lengths (iterable of int): Pattern lengths N to build tables for.
+        base_dir (str): Directory containing the Uniques folder.
+        processes (int): Number of worker processes (default: one per CPU; 1 builds in
+            this process).
+        chunk_rows (int): Rows per slice. Keep it between runs to reuse saved slices.
+        progress (bool): Show a progress bar of the slices of each table.
+    Returns:
+        List[tuple]: (N, path, patterns, seconds, slices reused) for each table built.
+    """
+    import shutil
+    import time
+    from tqdm.auto import tqdm
+    cache_dir = base_dir + "Uniques/"
+    if processes is None:
+        processes = os.cpu_count() or 1
+    built = []
+    pool = None
+    try:
+        for L in lengths:
+            if uniques.open_table(L,cache_dir,build = False) is not None:
+                continue
+            start_time = time.perf_counter()
+            count = uniques.unique_count(L)
+            parts_dir = os.path.join(cache_dir,f".{L}.parts")
+            os.makedirs(parts_dir,exist_ok = True)
+            jobs = [(L,parts_dir,start,min(start+chunk_rows,count)) for start in range(0,count,chunk_rows)]
+            parts = [_uniques_part_path(*job) for job in jobs]
+            todo = [job for job,part in zip(jobs,parts) if not os.path.isfile(part)]
+            if len(todo) > 1 and processes > 1 and pool is None:
+                import multiprocessing
+                pool = multiprocessing.Pool(min(processes,len(todo)))
+            results = map(_build_uniques_part,todo) if len(todo) <= 1 or pool is None else \
+                      pool.imap_unordered(_build_uniques_part,todo)
+            for _ in tqdm(results,total = len(todo),desc = f"Uniques {L}",disable = not progress):
+                pass
+            path = uniques.write_table(L,cache_dir,packed = (np.load(part,mmap_mode = "r") for part in parts))
+            shutil.rmtree(parts_dir,ignore_errors = True)  # with any temporary file of an interrupted worker
+            built.append((L,path,count,time.perf_counter()-start_time,len(jobs)-len(todo)))
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return(built)
+
+def _uniques_part_path(L,parts_dir,start,stop):
+    return(os.path.join(parts_dir,f"{start}-{stop}.npy"))
+
+def _build_uniques_part(job):
+    #packs rows start..stop of the table and saves them, via a temporary file so a part
+    #file is always complete
+    L,parts_dir,start,stop = job
+    rows = np.concatenate(list(uniques.pack_patterns(uniques.iter_unique_combinations(L,start,stop))))
+    path = _uniques_part_path(*job)
+    tmp_path = path[:-len(".npy")] + f".{os.getpid()}.tmp"
+    with open(tmp_path,"wb") as f:
+        np.save(f,rows)
+    os.replace(tmp_path,path)
+    return(path)
 
 if __name__ == "__main__":
     import argparse
@@ -352,24 +1366,65 @@ if __name__ == "__main__":
     parser.add_argument("--legend",help = "bool to print legend or not (0 = False,1 = True)")
     parser.add_argument("--breakdown",help = "bool to control whether to breakdown the lines with colour")
     parser.add_argument("-ah", "--arg_help",help = "Prints the available options for the chosen Attributes",action=argparse.BooleanOptionalAction)
+    subparsers = parser.add_subparsers(dest = "command")
+    batch_parser = subparsers.add_parser("batch",help = "render every spell in a CSV/JSONL spellbook")
+    batch_parser.add_argument("spellbook",help = "CSV (with header) or JSONL file of spells with columns: " + ", ".join(SPELL_FIELDS))
+    batch_parser.add_argument("-o","--out-dir",default = "spellbook",help = "directory to write the images to")
+    batch_parser.add_argument("-j","--processes",type = int,default = None,help = "number of worker processes (default: one per CPU)")
+    batch_parser.add_argument("--format",default = "png",help = "image format (png, svg, pdf, ...)")
+    batch_parser.add_argument("--report",default = "errors.csv",help = "file in the output directory listing spells that failed")
+    batch_parser.add_argument("--legend",action = "store_true",help = "draw a legend on each glyph")
+    batch_parser.add_argument("--breakdown",action = "store_true",help = "colour each attribute's lines separately")
+    atlas_parser = subparsers.add_parser("atlas",help = "draw every spell in a CSV/JSONL spellbook on one image")
+    atlas_parser.add_argument("spellbook",help = "CSV (with header) or JSONL file of spells with columns: " + ", ".join(SPELL_FIELDS))
+    atlas_parser.add_argument("-o","--output",default = "atlas.png",help = "PNG file to write")
+    atlas_parser.add_argument("--columns",type = int,default = 8,help = "glyphs per row")
+    atlas_parser.add_argument("--tile-size",type = float,default = 2.5,help = "size of each glyph's tile in inches")
+    atlas_parser.add_argument("--dpi",type = float,default = 100,help = "resolution of the image")
+    atlas_parser.add_argument("--breakdown",action = "store_true",help = "colour each attribute's lines separately")
+    uniques_parser = subparsers.add_parser("uniques",help = "build and cache the Uniques tables for a range of N")
+    uniques_parser.add_argument("first",type = int,help = "smallest pattern length N")
+    uniques_parser.add_argument("last",type = int,nargs = "?",help = "largest pattern length N (default: first)")
+    uniques_parser.add_argument("-j","--processes",type = int,default = None,help = "number of worker processes (default: one per CPU)")
+    uniques_parser.add_argument("--chunk-rows",type = int,default = 2**18,help = "rows per saved slice; keep it when resuming")
     args = parser.parse_args()
 
-    if args.arg_help:
+    if args.command == "uniques":
+        last = args.first if args.last is None else args.last
+        built = precompute_uniques(range(args.first,last+1),processes = args.processes,chunk_rows = args.chunk_rows)
+        for L,path,count,seconds,reused in built:
+            print(f"N = {L}: {count} patterns in {seconds:.1f} s ({count/max(seconds,1e-9):,.0f} patterns/s), "
+                  f"{reused} slices reused, written to {path}")
+        print(f"{len(built)} tables built, {last-args.first+1-len(built)} already cached")
+    elif args.command == "atlas":
+        savename,errors = render_atlas(args.spellbook,savename = args.output,columns = args.columns,
+                                       tile_size = args.tile_size,dpi = args.dpi,breakdown = args.breakdown)
+        print(f"atlas written to {savename}, {len(errors)} spells failed")
+        for i,title,error in errors:
+            print(f"  row {i} ({title}): {error}")
+    elif args.command == "batch":
+        written,errors = render_spellbook(args.spellbook,out_dir = args.out_dir,processes = args.processes,
+                                          fmt = args.format,report = args.report,
+                                          legend = args.legend,breakdown = args.breakdown)
+        print(f"{len(written)} spells written to {args.out_dir}, {len(errors)} failed")
+        for i,title,error in errors:
+            print(f"  row {i} ({title}): {error}")
+    elif args.arg_help:
         if args.range:
             print("--------Range--------")
-            print("\n".join(load_attribute("Attributes/range.txt")))
+            print("\n".join(registry.get_registry().values("range")))
         if args.level:
             print("--------Level--------")
-            print("\n".join(load_attribute("Attributes/levels.txt")))
+            print("\n".join(registry.get_registry().values("levels")))
         if args.area:
             print("--------Area--------")
-            print("\n".join(load_attribute("Attributes/area_types.txt")))
+            print("\n".join(registry.get_registry().values("area_types")))
         if args.dtype:
             print("--------Damage Types--------")
-            print("\n".join(load_attribute("Attributes/damage_types.txt")))
+            print("\n".join(registry.get_registry().values("damage_types")))
         if args.school:
             print("--------School--------")
-            print("\n".join(load_attribute("Attributes/school.txt")))
+            print("\n".join(registry.get_registry().values("school")))
     else:
         if args.legend:
             if args.legend == 1:
@@ -420,6 +1475,7 @@ if __name__ == "__main__":
         draw_spell(level,rang,area,dtype,school,title = title,legend = legend,
                 base_fn = bases.polygon,shape_fn = line_shapes.straight,
                 breakdown = breakdown,savename = savename)
+        import matplotlib.pyplot as plt
         plt.clf()
 
 def generate_image(prompt, output_path):